@@ -0,0 +1,131 @@
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import Date, cast, delete, insert, literal
+from sqlalchemy.orm import join, outerjoin
+from sqlmodel import Session, func, select
+
+from ..settings import settings
+from .models import (
+    DailyStat,
+    Message,
+    Offer,
+    Plan,
+    Project,
+    Role,
+    Status,
+    StatWatermark,
+    User,
+)
+from .types import StatMetricEnum
+
+WATERMARK = "daily_stats"
+columns = ["metric", "day", "dimension", "value"]
+
+
+def event_rollup(
+    metric: StatMetricEnum, source, created_at, dimension, start: datetime
+):
+    # psycopg2 inlines bound parameters, so a constant dimension would reach
+    # the GROUP BY as a bare '' which Postgres rejects
+    day = cast(created_at, Date)
+    keys = [day] if dimension is None else [day, dimension]
+    return (
+        select(
+            literal(metric.value),
+            day,
+            literal("") if dimension is None else dimension,
+            func.count(),
+        )
+        .select_from(source)
+        .where(created_at >= start)
+        .group_by(*keys)
+    )
+
+
+def event_rollups(start: datetime) -> dict:
+    # rows are counted on the day they were created, UTC
+    return {
+        StatMetricEnum.signups: event_rollup(
+            StatMetricEnum.signups,
+            outerjoin(User, Role, User.role_id == Role.id),
+            User.created_at,
+            func.coalesce(Role.title, ""),
+            start,
+        ),
+        StatMetricEnum.projects: event_rollup(
+            StatMetricEnum.projects, Project, Project.created_at, None, start
+        ),
+        StatMetricEnum.offers: event_rollup(
+            StatMetricEnum.offers,
+            join(Offer, User, Offer.offerer_id == User.id).outerjoin(
+                Plan, User.plan_id == Plan.id
+            ),
+            Offer.created_at,
+            func.coalesce(Plan.title, ""),
+            start,
+        ),
+        StatMetricEnum.messages: event_rollup(
+            StatMetricEnum.messages, Message, Message.created_at, None, start
+        ),
+    }
+
+
+def refresh_daily_stats(session: Session) -> int:
+    # days from the last run's day on are recounted and replaced, so a run
+    # reads about a day of each table through the created_at indexes and
+    # reruns are idempotent. Everything commits at once
+    now = datetime.utcnow()
+    watermark = session.get(StatWatermark, WATERMARK)
+    start = datetime(1970, 1, 1)
+    if watermark:
+        late = watermark.last_at - timedelta(seconds=settings.STATS_LATE_SECONDS)
+        start = datetime.combine(late.date(), datetime.min.time())
+    total = 0
+    for metric, query in event_rollups(start).items():
+        session.exec(
+            delete(DailyStat).where(
+                DailyStat.metric == metric, DailyStat.day >= start.date()
+            )
+        )
+        total += session.exec(insert(DailyStat).from_select(columns, query)).rowcount
+    # status moves do not leave a trail, so today's row is a snapshot
+    today = now.date()
+    session.exec(
+        delete(DailyStat).where(
+            DailyStat.metric == StatMetricEnum.projects_by_status,
+            DailyStat.day == today,
+        )
+    )
+    total += session.exec(
+        insert(DailyStat).from_select(
+            columns,
+            select(
+                literal(StatMetricEnum.projects_by_status.value),
+                literal(today),
+                Status.title,
+                func.count(Project.id),
+            )
+            .select_from(join(Status, Project, Project.status_id == Status.id))
+            .group_by(Status.title),
+        )
+    ).rowcount
+    if watermark is None:
+        watermark = StatWatermark(name=WATERMARK, last_at=now)
+    watermark.last_at = now
+    session.add(watermark)
+    session.commit()
+    return total
+
+
+def daily_stats(
+    session: Session, metric: StatMetricEnum, since: date, until: date
+) -> list[DailyStat]:
+    return session.exec(
+        select(DailyStat)
+        .where(
+            DailyStat.metric == metric,
+            DailyStat.day >= since,
+            DailyStat.day <= until,
+        )
+        .order_by(DailyStat.day, DailyStat.dimension)
+    ).all()
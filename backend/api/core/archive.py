@@ -0,0 +1,208 @@
+import gzip
+import os
+import zlib
+from datetime import datetime
+
+import orjson
+from sqlalchemy import func, insert, text
+from sqlmodel import Session, select
+
+from ..settings import settings
+from .models import Message, MessageArchive, MessageArchiveConversation, MessageOut
+from .search import drop_search_rows
+
+PARTITION_FORMAT = "message_y%Ym%m"
+columns = ["id", "from_user_id", "to_user_id", "text", "is_read", "created_at"]
+
+
+def add_months(value: datetime, months: int) -> datetime:
+    month = value.month - 1 + months
+    return datetime(value.year + month // 12, month % 12 + 1, 1)
+
+
+def month_start(value: datetime) -> datetime:
+    return datetime(value.year, value.month, 1)
+
+
+def archive_dir():
+    return settings.BASE_DIR / settings.DATA_PATH / settings.MESSAGE_ARCHIVE_PATH
+
+
+def message_partitions(session: Session) -> dict[datetime, str]:
+    names = session.exec(
+        text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = 'message'::regclass"
+        )
+    ).scalars()
+    partitions = {}
+    for name in names:
+        try:
+            partitions[datetime.strptime(name, PARTITION_FORMAT)] = name
+        except ValueError:
+            # a default or hand made partition, not managed by the jobs
+            continue
+    return partitions
+
+
+def create_message_partitions(session: Session) -> int:
+    # inserts fail without a partition, so the coming months always exist
+    existing = message_partitions(session)
+    start = month_start(datetime.utcnow())
+    created = 0
+    for months in range(settings.MESSAGE_PARTITIONS_AHEAD + 1):
+        partition_start = add_months(start, months)
+        if partition_start in existing:
+            continue
+        session.exec(
+            text(
+                f"CREATE TABLE IF NOT EXISTS "
+                f"{partition_start.strftime(PARTITION_FORMAT)} PARTITION OF message "
+                f"FOR VALUES FROM ('{partition_start.isoformat()}') "
+                f"TO ('{add_months(partition_start, 1).isoformat()}')"
+            )
+        )
+        created += 1
+    session.commit()
+    return created
+
+
+class ConversationWriter:
+    # Writes each conversation as its own gzip member and remembers where it
+    # starts. Concatenated members are still one valid gzip file.
+    def __init__(self, f, archive_id: int) -> None:
+        self.f = f
+        self.archive_id = archive_id
+        self.conversations: list[dict] = []
+        self.pair: tuple[int, int] | None = None
+        self.compressor = None
+        self.offset = 0
+        self.row_count = 0
+
+    def write(self, pair: tuple[int, int], line: bytes) -> None:
+        if pair != self.pair:
+            self.close()
+            self.pair = pair
+            self.compressor = zlib.compressobj(wbits=31)
+            self.offset = self.f.tell()
+            self.row_count = 0
+        self.f.write(self.compressor.compress(line))
+        self.row_count += 1
+
+    def close(self) -> None:
+        if self.pair is None:
+            return
+        self.f.write(self.compressor.flush())
+        self.conversations.append(
+            {
+                "user_low": self.pair[0],
+                "user_high": self.pair[1],
+                "archive_id": self.archive_id,
+                "row_count": self.row_count,
+                "byte_offset": self.offset,
+                "byte_length": self.f.tell() - self.offset,
+            }
+        )
+        self.pair = None
+
+
+def archive_partition(session: Session, start: datetime, name: str) -> int:
+    end = add_months(start, 1)
+    os.makedirs(archive_dir(), exist_ok=True)
+    path = archive_dir() / f"{name}.ndjson.gz"
+    partial = archive_dir() / f"{name}.ndjson.gz.partial"
+    archive = MessageArchive(
+        partition=name,
+        range_start=start,
+        range_end=end,
+        path=str(path.relative_to(archive_dir())),
+    )
+    session.add(archive)
+    session.flush()
+    # sorted by conversation, so reading one seeks to its member only
+    user_low = func.least(Message.from_user_id, Message.to_user_id)
+    user_high = func.greatest(Message.from_user_id, Message.to_user_id)
+    result = session.exec(
+        select(user_low, user_high, *(getattr(Message, column) for column in columns))
+        .where(Message.created_at >= start, Message.created_at < end)
+        .order_by(user_low, user_high, Message.created_at, Message.id)
+        .execution_options(stream_results=True, yield_per=settings.EXPORT_BATCH_SIZE)
+    )
+    row_count = 0
+    with open(partial, "wb") as f:
+        writer = ConversationWriter(f, archive.id)
+        for rows in result.partitions():
+            for low, high, *values in rows:
+                line = orjson.dumps(dict(zip(columns, values))) + b"\n"
+                writer.write((low, high), line)
+            row_count += len(rows)
+        writer.close()
+    os.replace(partial, path)
+    archive.row_count = row_count
+    conversations = writer.conversations
+    for first in range(0, len(conversations), settings.EXPORT_BATCH_SIZE):
+        session.exec(
+            insert(MessageArchiveConversation).values(
+                conversations[first : first + settings.EXPORT_BATCH_SIZE]
+            )
+        )
+    drop_search_rows(session, start, end)
+    # the file is in place before the rows go, both commit together
+    session.exec(text(f"ALTER TABLE message DETACH PARTITION {name}"))
+    session.exec(text(f"DROP TABLE {name}"))
+    session.commit()
+    return row_count
+
+
+def archive_message_partitions(session: Session) -> int:
+    cutoff = add_months(month_start(datetime.utcnow()), -settings.MESSAGE_HOT_MONTHS)
+    archived = 0
+    for start, name in sorted(message_partitions(session).items()):
+        if add_months(start, 1) > cutoff:
+            break
+        archived += archive_partition(session, start, name)
+    return archived
+
+
+def read_archived_messages(
+    session: Session,
+    user_id: int,
+    other_id: int,
+    before: tuple[datetime, int] | None,
+    limit: int,
+) -> list[MessageOut]:
+    # newest first, only the member of the conversation is read from each
+    # archive that holds it
+    query = (
+        select(
+            MessageArchive.path,
+            MessageArchiveConversation.byte_offset,
+            MessageArchiveConversation.byte_length,
+        )
+        .join(
+            MessageArchiveConversation,
+            MessageArchiveConversation.archive_id == MessageArchive.id,
+        )
+        .where(
+            MessageArchiveConversation.user_low == min(user_id, other_id),
+            MessageArchiveConversation.user_high == max(user_id, other_id),
+        )
+        .order_by(MessageArchive.range_start.desc())
+    )
+    if before:
+        query = query.where(MessageArchive.range_start <= before[0])
+    messages = []
+    for path, offset, length in session.exec(query):
+        with open(archive_dir() / path, "rb") as f:
+            f.seek(offset)
+            lines = gzip.decompress(f.read(length)).splitlines()
+        # a member is in ascending order, read from its end
+        for line in reversed(lines):
+            message = MessageOut(**orjson.loads(line))
+            if before and (message.created_at, message.id) >= before:
+                continue
+            messages.append(message)
+            if len(messages) >= limit:
+                return messages
+    return messages
@@ -0,0 +1,246 @@
+from datetime import datetime
+from typing import Iterator
+
+from sqlalchemy import delete, exists, true
+from sqlmodel import Session, and_, func, or_, select, update
+
+from ..settings import settings
+from .models import (
+    BulkRequestSelection,
+    BulkUserSelection,
+    Comment,
+    Education,
+    Experience,
+    FeedItem,
+    Follower,
+    FreelancerRank,
+    Message,
+    Offer,
+    Project,
+    Request,
+    ResetPasswordToken,
+    Role,
+    SampleProject,
+    User,
+    UserTechnology,
+    UserVerificationCode,
+)
+from .types import BulkOutcomeEnum, RoleEnum
+
+
+def id_batches(session: Session, key, ids: list[int] | None, *where) -> Iterator[list]:
+    # explicit ids are chunked as given, filters are walked with a keyset on
+    # the primary key so every batch is a bounded statement and transaction
+    size = settings.BULK_BATCH_SIZE
+    if ids is not None:
+        ids = sorted(set(ids))
+        for start in range(0, len(ids), size):
+            yield ids[start : start + size]
+        return
+    last_id = 0
+    while True:
+        batch = session.exec(
+            select(key).where(key > last_id, *where).order_by(key).limit(size)
+        ).all()
+        if batch:
+            yield batch
+        if len(batch) < size:
+            return
+        last_id = batch[-1]
+
+
+def missing_outcomes(
+    session: Session, key, batch: list[int], done: set, existing_outcome
+) -> dict[int, BulkOutcomeEnum]:
+    outcomes = {pk: BulkOutcomeEnum.ok for pk in done}
+    rest = [pk for pk in batch if pk not in done]
+    if rest:
+        existing = set(session.exec(select(key).where(key.in_(rest))).all())
+        for pk in rest:
+            outcomes[pk] = (
+                existing_outcome if pk in existing else BulkOutcomeEnum.not_found
+            )
+    return outcomes
+
+
+def request_filters(selection: BulkRequestSelection) -> list:
+    where = [Request.accepted.is_(None)]
+    if selection.created_before:
+        where.append(Request.created_at < selection.created_before)
+    return where
+
+
+def user_filters(selection: BulkUserSelection) -> list:
+    where = []
+    if selection.is_verified is not None:
+        where.append(User.is_verified.is_(selection.is_verified))
+    if selection.created_before:
+        where.append(User.created_at < selection.created_before)
+    return where
+
+
+def respond_to_requests(
+    session: Session, selection: BulkRequestSelection, accept: bool
+) -> dict[int, BulkOutcomeEnum]:
+    outcomes = {}
+    for batch in id_batches(
+        session, Request.id, selection.ids, *request_filters(selection)
+    ):
+        # only pending requests are answered, answered ones are a conflict
+        responded = session.exec(
+            update(Request)
+            .where(Request.id.in_(batch), Request.accepted.is_(None))
+            .values(accepted=accept, responded_at=datetime.utcnow())
+            .returning(Request.id, Request.user_id)
+            .execution_options(synchronize_session=False)
+        ).all()
+        if accept and responded:
+            session.exec(
+                update(User)
+                .where(User.id.in_({user_id for _, user_id in responded}))
+                .values(is_verified=True)
+                .execution_options(synchronize_session=False)
+            )
+        session.commit()
+        outcomes.update(
+            missing_outcomes(
+                session,
+                Request.id,
+                batch,
+                {pk for pk, _ in responded},
+                BulkOutcomeEnum.conflict,
+            )
+        )
+    return outcomes
+
+
+def set_users_verified(
+    session: Session, selection: BulkUserSelection, verified: bool
+) -> dict[int, BulkOutcomeEnum]:
+    outcomes = {}
+    for batch in id_batches(session, User.id, selection.ids, *user_filters(selection)):
+        # superusers are never changed
+        changed = set(
+            session.exec(
+                update(User)
+                .where(User.id.in_(batch), User.is_superuser.is_(False))
+                .values(is_verified=verified)
+                .returning(User.id)
+                .execution_options(synchronize_session=False)
+            ).scalars()
+        )
+        session.commit()
+        outcomes.update(
+            missing_outcomes(
+                session, User.id, batch, changed, BulkOutcomeEnum.forbidden
+            )
+        )
+    return outcomes
+
+
+def deletable_by(actor: User):
+    # superusers may delete anyone, other admins neither superusers nor admins
+    if actor.is_superuser:
+        return true()
+    admin_roles = select(Role.id).where(Role.title == RoleEnum.admin)
+    return and_(
+        User.is_superuser.is_(False),
+        or_(User.role_id.is_(None), User.role_id.not_in(admin_roles)),
+    )
+
+
+def has_history():
+    # rows other users depend on, these users are not deleted
+    return or_(
+        exists().where(or_(Project.owner_id == User.id, Project.doer_id == User.id)),
+        exists().where(Offer.offerer_id == User.id),
+        exists().where(Comment.from_user_id == User.id),
+        exists().where(
+            or_(Message.from_user_id == User.id, Message.to_user_id == User.id)
+        ),
+    )
+
+
+def delete_owned_rows(session: Session, user_ids: list[int]):
+    for key in (
+        UserTechnology.user_id,
+        SampleProject.user_id,
+        Education.user_id,
+        Experience.user_id,
+        Comment.to_user_id,
+        UserVerificationCode.user_id,
+        ResetPasswordToken.user_id,
+        Request.user_id,
+        FreelancerRank.user_id,
+        FeedItem.user_id,
+    ):
+        session.exec(
+            delete(key.class_)
+            .where(key.in_(user_ids))
+            .execution_options(synchronize_session=False)
+        )
+    follows = session.exec(
+        delete(Follower)
+        .where(
+            or_(Follower.follower_id.in_(user_ids), Follower.following_id.in_(user_ids))
+        )
+        .returning(Follower.follower_id, Follower.following_id)
+        .execution_options(synchronize_session=False)
+    ).all()
+    # the other side of each removed follow gets its counters recomputed
+    affected = {pk for follow in follows for pk in follow} - set(user_ids)
+    if affected:
+        session.exec(
+            update(User)
+            .where(User.id.in_(affected))
+            .values(
+                followers_count=select(func.count())
+                .where(Follower.following_id == User.id)
+                .scalar_subquery(),
+                followings_count=select(func.count())
+                .where(Follower.follower_id == User.id)
+                .scalar_subquery(),
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+
+def delete_users(
+    session: Session, selection: BulkUserSelection, actor: User
+) -> dict[int, BulkOutcomeEnum]:
+    outcomes = {}
+    allowed = deletable_by(actor)
+    for batch in id_batches(session, User.id, selection.ids, *user_filters(selection)):
+        batch = [pk for pk in batch if pk != actor.id]
+        # the candidate rows stay locked until the batch commits
+        rows = session.exec(
+            select(User.id, allowed, has_history())
+            .where(User.id.in_(batch))
+            .with_for_update(of=User)
+        ).all()
+        deletable = [pk for pk, is_allowed, busy in rows if is_allowed and not busy]
+        deleted = set()
+        if deletable:
+            delete_owned_rows(session, deletable)
+            deleted = set(
+                session.exec(
+                    delete(User)
+                    .where(User.id.in_(deletable))
+                    .returning(User.id)
+                    .execution_options(synchronize_session=False)
+                ).scalars()
+            )
+        session.commit()
+        found = {pk: is_allowed for pk, is_allowed, _ in rows}
+        for pk in batch:
+            if pk in deleted:
+                outcomes[pk] = BulkOutcomeEnum.ok
+            elif pk not in found:
+                outcomes[pk] = BulkOutcomeEnum.not_found
+            elif not found[pk]:
+                outcomes[pk] = BulkOutcomeEnum.forbidden
+            else:
+                outcomes[pk] = BulkOutcomeEnum.conflict
+    if selection.ids and actor.id in selection.ids:
+        outcomes[actor.id] = BulkOutcomeEnum.forbidden
+    return outcomes
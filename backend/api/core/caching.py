@@ -0,0 +1,150 @@
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from hashlib import md5
+from typing import Callable
+
+from fastapi import Request as ApiRequest
+from fastapi import Response
+from sqlmodel import Session, func, select
+
+from ..settings import settings
+from .responses import FastJSONResponse
+
+
+def collection_version(session: Session, model, *where) -> tuple:
+    # a row count plus the newest updated_at catches inserts, updates and
+    # deletes without reading the rows themselves
+    return session.exec(
+        select(func.count(), func.max(model.updated_at))
+        .select_from(model)
+        .where(*where)
+    ).one()
+
+
+def make_etag(*parts) -> str:
+    digest = md5("|".join(map(str, parts)).encode()).hexdigest()
+    return f'W/"{digest}"'
+
+
+def etag_matches(request: ApiRequest, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
+def conditional_response(
+    request: ApiRequest, route: str, etag: str, build: Callable
+) -> Response:
+    # build only runs when the client copy is stale
+    headers = {"ETag": etag}
+    cache_control = settings.CACHE_CONTROL.get(route)
+    if cache_control:
+        headers["Cache-Control"] = cache_control
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return FastJSONResponse(build(), headers=headers)
+
+
+class CacheBackend(ABC):
+    # Storage for ResponseCache. A shared backend (redis, memcached) only
+    # needs these three methods.
+    @abstractmethod
+    def get(self, key: str) -> bytes | None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def clear(self, prefix: str) -> None:
+        raise NotImplementedError
+
+
+class MemoryCacheBackend(CacheBackend):
+    def __init__(self, max_entries: int = 1024) -> None:
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expire_at, value = entry
+            if expire_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self, prefix: str) -> None:
+        with self._lock:
+            for key in [key for key in self._entries if key.startswith(prefix)]:
+                del self._entries[key]
+
+
+class ResponseCache:
+    def __init__(self, namespace: str, backend: CacheBackend, ttl: float) -> None:
+        self.namespace = namespace
+        self.backend = backend
+        self.ttl = ttl
+        self._generation = 0
+        # per key lock and the number of threads holding or waiting for it
+        self._locks: dict[str, list] = {}
+        self._locks_lock = threading.Lock()
+
+    def key(self, **params) -> str:
+        normalized = {}
+        for name, value in params.items():
+            if value is None:
+                continue
+            if isinstance(value, (list, set, tuple)):
+                value = sorted(value)
+            normalized[name] = value
+        # generation makes entries computed before an invalidation unreachable
+        return "{}:{}:{}".format(
+            self.namespace,
+            self._generation,
+            json.dumps(normalized, sort_keys=True, default=str),
+        )
+
+    def get_or_compute(self, key: str, compute: Callable[[], bytes]) -> bytes:
+        value = self.backend.get(key)
+        if value is not None:
+            return value
+        # only one thread computes a missing entry, the others wait for it.
+        # The lock lives until its last waiter is done, so nobody who arrives
+        # meanwhile gets a fresh one and computes again
+        with self._locks_lock:
+            entry = self._locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                value = self.backend.get(key)
+                if value is None:
+                    value = compute()
+                    self.backend.set(key, value, self.ttl)
+        finally:
+            with self._locks_lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._locks[key]
+        return value
+
+    def invalidate(self) -> None:
+        self._generation += 1
+        self.backend.clear(self.namespace + ":")
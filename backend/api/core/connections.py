@@ -0,0 +1,241 @@
+import asyncio
+import logging
+import time
+from datetime import timedelta
+from typing import Iterable
+
+from fastapi.websockets import WebSocket
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlmodel import Session, select
+from starlette.concurrency import run_in_threadpool
+
+from ..settings import settings
+from .models import Message, MessageOut
+from .responses import dumps
+from .types import OverflowPolicyEnum
+from .utils import Auth
+
+logger = logging.getLogger(__name__)
+
+
+def save_message(
+    session: Session, from_user_id: int, to_user_id: int, text: str
+) -> Message | None:
+    try:
+        message = Message(text=text, to_user_id=to_user_id, from_user_id=from_user_id)
+        session.add(message)
+        session.commit()
+        session.refresh(message)
+        return message
+    except (IntegrityError, DataError, ValueError):
+        session.rollback()
+        return None
+
+
+def messages_since(
+    session: Session, user_id: int, last_seen_id: int, limit: int
+) -> tuple[list[MessageOut], list[MessageOut]]:
+    # Ids are taken at insert, so a message below last_seen_id can commit
+    # after that one was delivered. The messages created up to
+    # CHAT_CATCHUP_OVERLAP_SECONDS before it are sent again, clients drop the
+    # ids they already have. Both are served by ix_message_to_user_id_id.
+    overlap = []
+    seen_at = session.exec(
+        select(Message.created_at).where(
+            Message.to_user_id == user_id, Message.id == last_seen_id
+        )
+    ).first()
+    if seen_at is not None:
+        overlap = session.exec(
+            select(Message)
+            .where(
+                Message.to_user_id == user_id,
+                Message.id < last_seen_id,
+                Message.created_at
+                >= seen_at - timedelta(seconds=settings.CHAT_CATCHUP_OVERLAP_SECONDS),
+            )
+            .order_by(Message.id.desc())
+            .limit(limit)
+        ).all()
+        # the ones nearest last_seen_id matter most, sent in id order
+        overlap.reverse()
+    newer = session.exec(
+        select(Message)
+        .where(Message.to_user_id == user_id, Message.id > last_seen_id)
+        .order_by(Message.id)
+        .limit(limit)
+    ).all()
+    return (
+        [MessageOut.from_orm(message) for message in overlap],
+        [MessageOut.from_orm(message) for message in newer],
+    )
+
+
+class Connection:
+    # One socket with a bounded queue of encoded frames drained by its own
+    # task, so a slow client only ever holds up itself.
+    def __init__(self, user_id: int, websocket: WebSocket, queue_size: int) -> None:
+        self.user_id = user_id
+        self.websocket = websocket
+        self.queue: asyncio.Queue[str] = asyncio.Queue(queue_size)
+        self.last_seen = time.monotonic()
+        self.dropped = 0
+        self.closed = False
+        self.sender: asyncio.Task | None = None
+
+
+class ConnectionManager:
+    # Registry of the chat sockets of this process, a user can have several.
+    # Presence is per worker, users connected to another worker are offline.
+    def __init__(
+        self,
+        queue_size: int,
+        overflow_policy: OverflowPolicyEnum,
+        max_per_user: int,
+        heartbeat_interval: float,
+        heartbeat_timeout: float,
+        send_timeout: float,
+    ) -> None:
+        self.queue_size = queue_size
+        self.overflow_policy = overflow_policy
+        self.max_per_user = max_per_user
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.send_timeout = send_timeout
+        self.active_connections: dict[int, list[Connection]] = {}
+
+    async def connect(self, user_id: int, websocket: WebSocket) -> Connection:
+        await websocket.accept()
+        connection = Connection(user_id, websocket, self.queue_size)
+        connection.sender = asyncio.create_task(self._send_loop(connection))
+        connections = self.active_connections.setdefault(user_id, [])
+        connections.append(connection)
+        # the oldest tab goes once a user has too many
+        while len(connections) > self.max_per_user:
+            self.close(connections[0], 1008)
+        return connection
+
+    def disconnect(self, connection: Connection) -> None:
+        # safe to call more than once, from the receive loop and the reaper
+        connection.closed = True
+        if connection.sender and connection.sender is not asyncio.current_task():
+            connection.sender.cancel()
+        connections = self.active_connections.get(connection.user_id)
+        if connections and connection in connections:
+            connections.remove(connection)
+            if not connections:
+                del self.active_connections[connection.user_id]
+
+    def close(self, connection: Connection, code: int = 1000) -> None:
+        self.disconnect(connection)
+        asyncio.create_task(self._close_socket(connection.websocket, code))
+
+    async def _close_socket(self, websocket: WebSocket, code: int) -> None:
+        try:
+            await websocket.close(code)
+        except Exception:
+            pass
+
+    async def _send_loop(self, connection: Connection) -> None:
+        try:
+            while True:
+                text = await connection.queue.get()
+                await asyncio.wait_for(
+                    connection.websocket.send_text(text), self.send_timeout
+                )
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.close(connection, 1011)
+
+    def touch(self, connection: Connection) -> None:
+        connection.last_seen = time.monotonic()
+
+    def is_connected(self, user_id: int) -> bool:
+        return user_id in self.active_connections
+
+    def online(self, user_ids: Iterable[int]) -> list[int]:
+        return [user_id for user_id in user_ids if user_id in self.active_connections]
+
+    def enqueue(self, connection: Connection, text: str) -> bool:
+        if connection.closed:
+            return False
+        try:
+            connection.queue.put_nowait(text)
+            return True
+        except asyncio.QueueFull:
+            connection.dropped += 1
+        if self.overflow_policy == OverflowPolicyEnum.disconnect:
+            logger.info("closing slow chat socket of user %s", connection.user_id)
+            self.close(connection, 1013)
+            return False
+        # drop the oldest frame, the newest is the one worth delivering
+        connection.queue.get_nowait()
+        connection.queue.put_nowait(text)
+        return True
+
+    async def send_json(self, user_id: int, data: dict) -> int:
+        # never waits on a socket, returns how many sockets got the frame
+        connections = self.active_connections.get(user_id)
+        if not connections:
+            return 0
+        text = dumps(data).decode()
+        return sum(self.enqueue(connection, text) for connection in list(connections))
+
+    async def run(self) -> None:
+        # pings idle sockets and reaps the ones that stopped answering
+        ping = dumps({"type": "ping"}).decode()
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            now = time.monotonic()
+            for connections in list(self.active_connections.values()):
+                for connection in list(connections):
+                    idle = now - connection.last_seen
+                    if idle > self.heartbeat_timeout:
+                        self.close(connection, 1001)
+                    elif idle > self.heartbeat_interval:
+                        self.enqueue(connection, ping)
+
+    async def catch_up(
+        self, connection: Connection, session: Session, last_seen_id: int
+    ) -> None:
+        # everything received after last_seen_id in one frame, clients ask
+        # again from last_id while has_more is set
+        overlap, newer = await run_in_threadpool(
+            messages_since,
+            session,
+            connection.user_id,
+            last_seen_id,
+            settings.CHAT_CATCHUP_LIMIT + 1,
+        )
+        has_more = len(newer) > settings.CHAT_CATCHUP_LIMIT
+        newer = newer[: settings.CHAT_CATCHUP_LIMIT]
+        frame = {
+            "type": "catchup",
+            "messages": overlap + newer,
+            "last_id": newer[-1].id if newer else last_seen_id,
+            "has_more": has_more,
+        }
+        self.enqueue(connection, dumps(frame).decode())
+
+    async def send_personal_message(self, auth: Auth, message_block: dict):
+        text = message_block.get("text")
+        to_user_id = message_block.get("to_user_id")
+        if to_user_id and text:
+            to_user_id = int(to_user_id)
+            # stored first so the live frame carries the id used to catch up
+            message = await run_in_threadpool(
+                save_message, auth.session, auth.user.id, to_user_id, text
+            )
+            if message is None:
+                return
+            await self.send_json(
+                to_user_id,
+                {
+                    "id": message.id,
+                    "text": text,
+                    "to_user_id": to_user_id,
+                    "from_user_id": auth.user.id,
+                    "created_at": message.created_at,
+                },
+            )
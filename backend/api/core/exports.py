@@ -0,0 +1,64 @@
+import csv
+import io
+from typing import Iterator
+
+import orjson
+from fastapi.responses import StreamingResponse
+from sqlmodel import Session
+
+from ..db import get_engine
+from ..settings import settings
+from .types import ExportFormatEnum
+
+media_types = {
+    ExportFormatEnum.ndjson: "application/x-ndjson",
+    ExportFormatEnum.csv: "text/csv",
+}
+
+
+def _csv_value(value):
+    return getattr(value, "value", value)
+
+
+def export_rows(query, export_format: ExportFormatEnum) -> Iterator[bytes]:
+    # runs after the request session is gone, so it owns its session. Rows
+    # come from a server side cursor one batch at a time and each batch is
+    # sent as one chunk
+    with Session(get_engine()) as session:
+        result = session.exec(
+            query.execution_options(
+                stream_results=True, yield_per=settings.EXPORT_BATCH_SIZE
+            )
+        )
+        columns = list(result.keys())
+        if export_format == ExportFormatEnum.csv:
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(columns)
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+            for rows in result.partitions():
+                writer.writerows([_csv_value(value) for value in row] for row in rows)
+                yield buffer.getvalue().encode()
+                buffer.seek(0)
+                buffer.truncate()
+        else:
+            for rows in result.partitions():
+                yield b"".join(
+                    orjson.dumps(dict(zip(columns, row))) + b"\n" for row in rows
+                )
+
+
+def export_response(
+    query, export_format: ExportFormatEnum, name: str
+) -> StreamingResponse:
+    return StreamingResponse(
+        export_rows(query, export_format),
+        media_type=media_types[export_format],
+        headers={
+            "Content-Disposition": (
+                f'attachment; filename="{name}.{export_format.value}"'
+            )
+        },
+    )
@@ -0,0 +1,483 @@
+import bisect
+import heapq
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from typing import Iterable, List, NamedTuple
+
+from sqlalchemy.dialects.postgresql import array
+from sqlmodel import Session, func, select
+
+from ..settings import settings
+from .models import (
+    Project,
+    ProjectTechnology,
+    Status,
+    Technology,
+    TechnologyOut,
+    UserTechnology,
+)
+from .types import ProjectStatusEnum, SortDirEnum, SortEnum
+
+
+class OpenProject(NamedTuple):
+    id: int
+    created_at: datetime
+    price_to: int
+    title: str
+    technology_ids: frozenset
+
+
+class ReloadingIndex(ABC):
+    # Each worker keeps its own copy of an index, updated by the endpoints that
+    # change it and fully reloaded every INDEX_RELOAD_SECONDS to pick up
+    # changes made by other workers. Indexes that override refresh also read
+    # just the rows changed since their last read every refresh_seconds.
+    def __init__(self, reload_seconds: float, refresh_seconds: float | None = None):
+        self.reload_seconds = reload_seconds
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.RLock()
+        self._loaded_at: float | None = None
+        self._refreshed_at: float | None = None
+
+    def ensure_loaded(self, session: Session) -> None:
+        now = time.monotonic()
+        if self._loaded_at is None or now - self._loaded_at > self.reload_seconds:
+            self.load(session)
+        elif (
+            self.refresh_seconds is not None
+            and now - self._refreshed_at > self.refresh_seconds
+        ):
+            self.refresh(session)
+
+    @abstractmethod
+    def load(self, session: Session) -> None:
+        raise NotImplementedError
+
+    def refresh(self, session: Session) -> None:
+        self.load(session)
+
+    def invalidate(self) -> None:
+        # reloaded from the database on the next ensure_loaded
+        self._loaded_at = None
+
+
+class ProjectSkillIndex(ReloadingIndex):
+    # Inverted index from technology id to the ids of unassigned projects.
+    def __init__(self, reload_seconds: float, refresh_seconds: float) -> None:
+        super().__init__(reload_seconds, refresh_seconds)
+        self._postings: dict[int, set[int]] = defaultdict(set)
+        self._projects: dict[int, OpenProject] = {}
+        self._watermark: datetime | None = None
+        # add and remove calls made while a load or refresh is reading the
+        # database, replayed over its rows so they are not lost
+        self._pending: list[dict[int, OpenProject | None]] = []
+
+    def _read(
+        self, session: Session, since: datetime | None
+    ) -> dict[int, OpenProject | None]:
+        query = (
+            select(
+                Project.id,
+                Project.created_at,
+                Project.price_to,
+                Project.title,
+                Status.title,
+                ProjectTechnology.technology_id,
+            )
+            .join(Status, Project.status_id == Status.id)
+            .outerjoin(ProjectTechnology, ProjectTechnology.project_id == Project.id)
+        )
+        if since is None:
+            query = query.where(Status.title == ProjectStatusEnum.unassigned)
+        else:
+            query = query.where(Project.updated_at >= since)
+        result = session.exec(query)
+        rows = {}
+        technologies = defaultdict(set)
+        for project_id, created_at, price_to, title, status, technology_id in result:
+            if status != ProjectStatusEnum.unassigned:
+                # no longer open, dropped from the index
+                rows[project_id] = None
+                continue
+            rows[project_id] = (created_at, price_to, title)
+            if technology_id is not None:
+                technologies[project_id].add(technology_id)
+        return {
+            project_id: (
+                OpenProject(project_id, *row, frozenset(technologies[project_id]))
+                if row is not None
+                else None
+            )
+            for project_id, row in rows.items()
+        }
+
+    def load(self, session: Session) -> None:
+        self._apply(session, full=True)
+
+    def refresh(self, session: Session) -> None:
+        self._apply(session, full=False)
+
+    def _apply(self, session: Session, full: bool) -> None:
+        pending = {}
+        with self._lock:
+            self._pending.append(pending)
+            since = None if full or self._watermark is None else self._watermark
+        try:
+            # updated_at comes from each worker's clock and rows commit after
+            # it is set, so the next refresh re-reads an overlapping window
+            watermark = datetime.utcnow() - timedelta(
+                seconds=settings.INDEX_REFRESH_OVERLAP_SECONDS
+            )
+            projects = self._read(session, since)
+        finally:
+            with self._lock:
+                self._pending.remove(pending)
+        with self._lock:
+            if since is None:
+                self._postings = defaultdict(set)
+                self._projects = {}
+            projects.update(pending)
+            for project_id, project in projects.items():
+                self._remove(project_id)
+                if project is not None:
+                    self._add(project)
+            self._watermark = watermark
+            self._refreshed_at = time.monotonic()
+            if since is None:
+                self._loaded_at = self._refreshed_at
+
+    def _add(self, project: OpenProject) -> None:
+        self._projects[project.id] = project
+        for technology_id in project.technology_ids:
+            self._postings[technology_id].add(project.id)
+
+    def _remove(self, project_id: int) -> None:
+        project = self._projects.pop(project_id, None)
+        if project is None:
+            return
+        for technology_id in project.technology_ids:
+            postings = self._postings.get(technology_id)
+            if postings is not None:
+                postings.discard(project_id)
+                if not postings:
+                    del self._postings[technology_id]
+
+    def add(
+        self,
+        project_id: int,
+        created_at: datetime,
+        price_to: int,
+        title: str,
+        technology_ids: Iterable[int],
+    ) -> None:
+        project = OpenProject(
+            project_id, created_at, price_to, title, frozenset(technology_ids)
+        )
+        with self._lock:
+            for pending in self._pending:
+                pending[project_id] = project
+            self._remove(project_id)
+            self._add(project)
+
+    def remove(self, project_id: int) -> None:
+        with self._lock:
+            for pending in self._pending:
+                pending[project_id] = None
+            self._remove(project_id)
+
+    def match(
+        self,
+        technology_ids: Iterable[int],
+        count: int,
+        title: str | None = None,
+        min_price: int = 0,
+        max_price: int | None = None,
+        sort: SortEnum = SortEnum.date,
+        sort_dir: SortDirEnum = SortDirEnum.descending,
+    ) -> List[int]:
+        # only the postings of the given technologies are visited, ranked by
+        # the number of shared technologies and then by the sort column
+        with self._lock:
+            overlap = Counter()
+            for technology_id in set(technology_ids):
+                overlap.update(self._postings.get(technology_id, ()))
+            candidates = []
+            for project_id, shared in overlap.items():
+                project = self._projects[project_id]
+                if project.price_to < min_price:
+                    continue
+                if max_price and project.price_to > max_price:
+                    continue
+                if title and title not in project.title:
+                    continue
+                if sort == SortEnum.price:
+                    value = project.price_to
+                else:
+                    value = project.created_at.timestamp()
+                if sort_dir == SortDirEnum.descending:
+                    value = -value
+                candidates.append((-shared, value, -project_id))
+        return [-item[2] for item in heapq.nsmallest(count, candidates)]
+
+
+class FreelancerSkillIndex(ReloadingIndex):
+    # Inverted index from technology id to the ids of users having that skill.
+    def __init__(self, reload_seconds: float) -> None:
+        super().__init__(reload_seconds)
+        self._postings: dict[int, set[int]] = defaultdict(set)
+        self._skills: dict[int, frozenset] = {}
+
+    def load(self, session: Session) -> None:
+        skills = defaultdict(set)
+        result = session.exec(
+            select(UserTechnology.user_id, UserTechnology.technology_id)
+        )
+        for user_id, technology_id in result:
+            skills[user_id].add(technology_id)
+        with self._lock:
+            self._postings = defaultdict(set)
+            self._skills = {}
+            for user_id, technology_ids in skills.items():
+                self._set(user_id, frozenset(technology_ids))
+            self._loaded_at = time.monotonic()
+
+    def _set(self, user_id: int, technology_ids: frozenset) -> None:
+        self._skills[user_id] = technology_ids
+        for technology_id in technology_ids:
+            self._postings[technology_id].add(user_id)
+
+    def set_user(self, user_id: int, technology_ids: Iterable[int]) -> None:
+        with self._lock:
+            if self._loaded_at is None:
+                return
+            self.remove(user_id)
+            self._set(user_id, frozenset(technology_ids))
+
+    def remove(self, user_id: int) -> None:
+        with self._lock:
+            for technology_id in self._skills.pop(user_id, ()):
+                postings = self._postings.get(technology_id)
+                if postings is not None:
+                    postings.discard(user_id)
+                    if not postings:
+                        del self._postings[technology_id]
+
+    def match(self, technology_ids: Iterable[int]) -> set[int]:
+        with self._lock:
+            users = set()
+            for technology_id in set(technology_ids):
+                users.update(self._postings.get(technology_id, ()))
+            return users
+
+
+class TechnologyIndex(ReloadingIndex):
+    # n-gram index over technology titles and slugs for the skill picker.
+    # Every substring of up to NGRAM characters is a key, longer queries
+    # intersect the postings of their n-grams and verify the hits.
+    NGRAM = 3
+
+    def __init__(self, reload_seconds: float) -> None:
+        super().__init__(reload_seconds)
+        self.version: tuple = ()
+        self._grams: dict[str, set[int]] = {}
+        self._keys: dict[int, tuple[str, ...]] = {}
+        self._technologies: dict[int, dict] = {}
+        self._popularity: dict[int, int] = {}
+
+    def load(self, session: Session) -> None:
+        popularity = Counter()
+        for model in (ProjectTechnology, UserTechnology):
+            popularity.update(
+                dict(
+                    session.exec(
+                        select(model.technology_id, func.count()).group_by(
+                            model.technology_id
+                        )
+                    ).all()
+                )
+            )
+        technologies = session.exec(select(Technology)).all()
+        grams = defaultdict(set)
+        keys = {}
+        for technology in technologies:
+            keys[technology.id] = tuple(
+                key.lower() for key in (technology.title, technology.slug) if key
+            )
+            for key in keys[technology.id]:
+                for size in range(1, self.NGRAM + 1):
+                    for start in range(len(key) - size + 1):
+                        grams[key[start : start + size]].add(technology.id)
+        with self._lock:
+            self._grams = dict(grams)
+            self._keys = keys
+            self._technologies = {
+                technology.id: TechnologyOut.from_orm(technology).dict()
+                for technology in technologies
+            }
+            self._popularity = dict(popularity)
+            self.version = (
+                len(technologies),
+                max((t.updated_at for t in technologies if t.updated_at), default=0),
+                sum(popularity.values()),
+            )
+            self._loaded_at = time.monotonic()
+
+    def search(self, query: str, limit: int) -> List[dict]:
+        query = query.lower()
+        with self._lock:
+            if not query:
+                candidates = set(self._technologies)
+            elif len(query) <= self.NGRAM:
+                candidates = self._grams.get(query, set())
+            else:
+                postings = [
+                    self._grams.get(query[start : start + self.NGRAM], set())
+                    for start in range(len(query) - self.NGRAM + 1)
+                ]
+                candidates = set.intersection(*sorted(postings, key=len))
+                candidates = {
+                    tech_id
+                    for tech_id in candidates
+                    if any(query in key for key in self._keys[tech_id])
+                }
+            # prefix matches first, then the most used technologies
+            ranked = heapq.nsmallest(
+                limit,
+                candidates,
+                key=lambda tech_id: (
+                    not any(key.startswith(query) for key in self._keys[tech_id]),
+                    -self._popularity.get(tech_id, 0),
+                    self._keys[tech_id][0],
+                ),
+            )
+            return [self._technologies[tech_id] for tech_id in ranked]
+
+    def get(self, tech_id: int) -> dict | None:
+        return self._technologies.get(tech_id)
+
+    def ids_for_slugs(self, slugs: Iterable[str]) -> set[int]:
+        slugs = set(slugs)
+        with self._lock:
+            return {
+                tech_id
+                for tech_id, technology in self._technologies.items()
+                if technology["slug"] in slugs
+            }
+
+
+def price_bucket_bounds() -> list[tuple[int | None, int | None]]:
+    # bucket i holds prices in [bounds[i - 1], bounds[i]), same as width_bucket
+    bounds = [None, *settings.PRICE_BUCKETS, None]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def price_bucket_expression(price):
+    return func.width_bucket(price, array(settings.PRICE_BUCKETS))
+
+
+class ProjectFacetRollup(ReloadingIndex):
+    # Project counts per (status, price bucket) and per (status, price bucket,
+    # technology), kept current by the endpoints that create projects or
+    # change their status.
+    def __init__(self, reload_seconds: float) -> None:
+        super().__init__(reload_seconds)
+        self._totals: Counter = Counter()
+        self._by_technology: Counter = Counter()
+
+    def load(self, session: Session) -> None:
+        bucket = price_bucket_expression(Project.price_to)
+        totals = session.exec(
+            select(Status.title, bucket, func.count())
+            .join(Status, Project.status_id == Status.id)
+            .group_by(Status.title, bucket)
+        ).all()
+        by_technology = session.exec(
+            select(Status.title, bucket, ProjectTechnology.technology_id, func.count())
+            .join(Status, Project.status_id == Status.id)
+            .join(ProjectTechnology, ProjectTechnology.project_id == Project.id)
+            .group_by(Status.title, bucket, ProjectTechnology.technology_id)
+        ).all()
+        with self._lock:
+            self._totals = Counter(
+                {(status, bucket): count for status, bucket, count in totals}
+            )
+            self._by_technology = Counter(
+                {
+                    (status, bucket, tech_id): count
+                    for status, bucket, tech_id, count in by_technology
+                }
+            )
+            self._loaded_at = time.monotonic()
+
+    def add(
+        self,
+        status: str,
+        price_to: int,
+        technology_ids: Iterable[int],
+        delta: int = 1,
+    ) -> None:
+        with self._lock:
+            if self._loaded_at is None:
+                return
+            status = getattr(status, "value", status)
+            bucket = bisect.bisect_right(settings.PRICE_BUCKETS, price_to)
+            self._totals[(status, bucket)] += delta
+            for tech_id in technology_ids:
+                self._by_technology[(status, bucket, tech_id)] += delta
+
+    def move(
+        self,
+        price_to: int,
+        technology_ids: Iterable[int],
+        from_status: str,
+        to_status: str,
+    ) -> None:
+        technology_ids = list(technology_ids)
+        with self._lock:
+            self.add(from_status, price_to, technology_ids, -1)
+            self.add(to_status, price_to, technology_ids)
+
+    def facets(
+        self,
+        is_open: bool | None,
+        min_price: int,
+        max_price: int | None,
+        technology_id: int | None,
+    ) -> tuple[dict[int, int], list[int]]:
+        # price filters are applied at bucket granularity; the technology
+        # counts ignore the technology filter so every option keeps a count
+        def status_matches(status):
+            if is_open is None:
+                return True
+            return (status == ProjectStatusEnum.unassigned) == is_open
+
+        buckets = {
+            index
+            for index, (low, high) in enumerate(price_bucket_bounds())
+            if (high is None or high > (min_price or 0))
+            and (max_price is None or low is None or low <= max_price)
+        }
+        technologies = Counter()
+        prices = [0] * len(price_bucket_bounds())
+        with self._lock:
+            for (status, bucket, tech_id), count in self._by_technology.items():
+                if count and bucket in buckets and status_matches(status):
+                    technologies[tech_id] += count
+                    if tech_id == technology_id:
+                        prices[bucket] += count
+            if technology_id is None:
+                for (status, bucket), count in self._totals.items():
+                    if bucket in buckets and status_matches(status):
+                        prices[bucket] += count
+        return dict(technologies), prices
+
+
+project_skill_index = ProjectSkillIndex(
+    settings.INDEX_RELOAD_SECONDS, settings.INDEX_REFRESH_SECONDS
+)
+project_facets = ProjectFacetRollup(settings.INDEX_RELOAD_SECONDS)
+technology_index = TechnologyIndex(settings.INDEX_RELOAD_SECONDS)
+freelancer_skill_index = FreelancerSkillIndex(settings.INDEX_RELOAD_SECONDS)
@@ -0,0 +1,209 @@
+import argparse
+import logging
+import threading
+import traceback
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Callable
+
+from sqlmodel import Session, func, select, update
+
+from ..db import get_engine
+from ..settings import settings
+from .maintenance import scheduler
+from .models import Job
+from .types import JobStatusEnum
+from .utils import sendmail
+
+logger = logging.getLogger(__name__)
+
+handlers: dict[str, Callable] = {}
+
+
+def job_handler(name: str):
+    def register(func: Callable) -> Callable:
+        handlers[name] = func
+        return func
+
+    return register
+
+
+def enqueue(session: Session, name: str, **payload) -> Job:
+    # added to the caller's session, so the job is committed together with
+    # the rows it refers to
+    job = Job(name=name, payload=payload, max_attempts=settings.JOB_MAX_ATTEMPTS)
+    session.add(job)
+    return job
+
+
+def queue_stats(session: Session) -> dict:
+    stats = {status.value: 0 for status in JobStatusEnum}
+    for status, count in session.exec(
+        select(Job.status, func.count()).group_by(Job.status)
+    ):
+        stats[status] = count
+    oldest = session.exec(
+        select(func.min(Job.run_at)).where(Job.status == JobStatusEnum.queued)
+    ).first()
+    stats["oldest_queued_seconds"] = (
+        (datetime.utcnow() - oldest).total_seconds() if oldest else 0
+    )
+    return stats
+
+
+@job_handler("sendmail")
+def send_mail(recipient: str, body: str, subject: str = "Freelancer"):
+    sendmail(recipient, body, subject, raise_errors=True)
+
+
+@job_handler("maintenance")
+def run_maintenance(job: str):
+    scheduler.run_once([job])
+
+
+class Worker:
+    # Pulls due jobs with SELECT ... FOR UPDATE SKIP LOCKED, so any number of
+    # worker processes and threads can share the queue without double runs.
+    def __init__(self, concurrency: int, poll_interval: float) -> None:
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.latencies: dict[str, deque] = {}
+        self.durations: dict[str, deque] = {}
+        self._stop = threading.Event()
+        self._metrics_lock = threading.Lock()
+
+    def claim(self, session: Session) -> Job | None:
+        now = datetime.utcnow()
+        job = session.exec(
+            select(Job)
+            .where(Job.status == JobStatusEnum.queued, Job.run_at <= now)
+            .order_by(Job.run_at)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        ).first()
+        if job is None:
+            session.rollback()
+            return None
+        job.status = JobStatusEnum.running
+        job.locked_at = now
+        job.attempts += 1
+        session.add(job)
+        session.commit()
+        return job
+
+    def process(self, session: Session, job: Job) -> None:
+        started = datetime.utcnow()
+        latency = (started - job.run_at).total_seconds()
+        try:
+            handler = handlers[job.name]
+            handler(**job.payload)
+            job.status = JobStatusEnum.done
+            job.last_error = None
+        except Exception:
+            job.last_error = traceback.format_exc(limit=5)
+            if job.attempts >= job.max_attempts:
+                job.status = JobStatusEnum.failed
+                logger.error("job %s %s failed for good", job.id, job.name)
+            else:
+                job.status = JobStatusEnum.queued
+                job.run_at = datetime.utcnow() + timedelta(
+                    seconds=settings.JOB_RETRY_BACKOFF_SECONDS * 2 ** (job.attempts - 1)
+                )
+        job.locked_at = None
+        session.add(job)
+        session.commit()
+        self.record(job.name, latency, started)
+
+    def record(self, name: str, latency: float, started: datetime) -> None:
+        duration = (datetime.utcnow() - started).total_seconds()
+        with self._metrics_lock:
+            self.latencies.setdefault(name, deque(maxlen=1000)).append(latency)
+            self.durations.setdefault(name, deque(maxlen=1000)).append(duration)
+
+    def requeue_stale(self, session: Session) -> int:
+        # jobs whose worker died or hung while running them. The attempt was
+        # counted when the job was claimed, so a job that keeps taking its
+        # worker down fails for good like any other
+        stale = (
+            Job.status == JobStatusEnum.running,
+            Job.locked_at
+            < datetime.utcnow() - timedelta(seconds=settings.JOB_TIMEOUT_SECONDS),
+        )
+        error = "worker timed out"
+        failed = session.exec(
+            update(Job)
+            .where(*stale, Job.attempts >= Job.max_attempts)
+            .values(status=JobStatusEnum.failed, locked_at=None, last_error=error)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if failed:
+            logger.error("%s stale jobs failed for good", failed)
+        result = session.exec(
+            update(Job)
+            .where(*stale)
+            .values(status=JobStatusEnum.queued, locked_at=None, last_error=error)
+            .execution_options(synchronize_session=False)
+        )
+        session.commit()
+        return result.rowcount
+
+    def report(self) -> None:
+        with self._metrics_lock:
+            for name, latencies in self.latencies.items():
+                ordered = sorted(latencies)
+                durations = sorted(self.durations[name])
+                logger.info(
+                    "job %s: latency p50 %.3fs p95 %.3fs, run p50 %.3fs p95 %.3fs",
+                    name,
+                    ordered[len(ordered) // 2],
+                    ordered[int(len(ordered) * 0.95)],
+                    durations[len(durations) // 2],
+                    durations[int(len(durations) * 0.95)],
+                )
+
+    def _run(self) -> None:
+        with Session(get_engine()) as session:
+            while not self._stop.is_set():
+                try:
+                    job = self.claim(session)
+                except Exception:
+                    session.rollback()
+                    logger.exception("claiming a job failed")
+                    job = None
+                if job is None:
+                    self._stop.wait(self.poll_interval)
+                    continue
+                self.process(session, job)
+
+    def run(self) -> None:
+        threads = [
+            threading.Thread(target=self._run, name=f"job-worker-{i}", daemon=True)
+            for i in range(self.concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            while not self._stop.wait(settings.JOB_TIMEOUT_SECONDS / 2):
+                with Session(get_engine()) as session:
+                    requeued = self.requeue_stale(session)
+                if requeued:
+                    logger.warning("requeued %s stale jobs", requeued)
+                self.report()
+        except KeyboardInterrupt:
+            self._stop.set()
+        for thread in threads:
+            thread.join()
+
+
+def main():
+    # python -m api.core.jobs --concurrency 4
+    parser = argparse.ArgumentParser(description="run the background job worker")
+    parser.add_argument("--concurrency", type=int, default=settings.JOB_CONCURRENCY)
+    parser.add_argument("--poll-interval", type=float, default=1.0)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    Worker(args.concurrency, args.poll_interval).run()
+
+
+if __name__ == "__main__":
+    main()
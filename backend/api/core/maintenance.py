@@ -0,0 +1,312 @@
+import argparse
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable
+
+from sqlalchemy import delete
+from sqlalchemy.sql.expression import tuple_
+from sqlmodel import Session, SQLModel, select, update
+
+from ..db import get_engine
+from ..settings import settings
+from .analytics import refresh_daily_stats
+from .archive import archive_message_partitions, create_message_partitions
+from .indexes import project_facets, project_skill_index
+from .models import (
+    Job,
+    Plan,
+    Project,
+    ProjectChange,
+    ResetPasswordToken,
+    Status,
+    User,
+    UserVerificationCode,
+)
+from .rankings import refresh_stale_freelancer_ranks
+from .search import index_messages
+from .types import JobStatusEnum, PlanEnum, ProjectStatusEnum
+
+logger = logging.getLogger(__name__)
+
+
+class JobMetrics(SQLModel):
+    runs: int = 0
+    failures: int = 0
+    total_rows: int = 0
+    last_rows: int = 0
+    last_duration: float = 0
+    last_run_at: datetime | None = None
+
+
+def downgrade_expired_plans(session: Session) -> int:
+    free_plan_id = select(Plan.id).where(Plan.title == PlanEnum.free).scalar_subquery()
+    result = session.exec(
+        update(User)
+        .where(User.plan_expire_at < datetime.utcnow())
+        .values(plan_id=free_plan_id, plan_expire_at=None)
+        .execution_options(synchronize_session=False)
+    )
+    session.commit()
+    return result.rowcount
+
+
+def delete_in_batches(session: Session, key, *where) -> int:
+    # each batch is its own transaction, so locks are held for one batch only
+    total = 0
+    while True:
+        result = session.exec(
+            delete(key.class_)
+            .where(
+                key.in_(
+                    select(key).where(*where).limit(settings.MAINTENANCE_BATCH_SIZE)
+                )
+            )
+            .execution_options(synchronize_session=False)
+        )
+        session.commit()
+        total += result.rowcount
+        if result.rowcount < settings.MAINTENANCE_BATCH_SIZE:
+            return total
+
+
+def purge_expired_verification_codes(session: Session) -> int:
+    return delete_in_batches(
+        session,
+        UserVerificationCode.code,
+        UserVerificationCode.expire_at < datetime.utcnow(),
+    )
+
+
+def purge_expired_reset_tokens(session: Session) -> int:
+    return delete_in_batches(
+        session,
+        ResetPasswordToken.token,
+        ResetPasswordToken.expire_at < datetime.utcnow(),
+    )
+
+
+def expire_stale_projects(session: Session) -> int:
+    unassigned_id = session.exec(
+        select(Status.id).where(Status.title == ProjectStatusEnum.unassigned)
+    ).one()
+    expired_id = session.exec(
+        select(Status.id).where(Status.title == ProjectStatusEnum.expired)
+    ).one()
+    total = 0
+    while True:
+        result = session.exec(
+            update(Project)
+            .where(
+                Project.id.in_(
+                    select(Project.id)
+                    .where(
+                        Project.status_id == unassigned_id,
+                        Project.expire_at < datetime.utcnow(),
+                    )
+                    .limit(settings.MAINTENANCE_BATCH_SIZE)
+                )
+            )
+            .values(status_id=expired_id)
+            .returning(Project.id)
+            .execution_options(synchronize_session=False)
+        )
+        project_ids = result.scalars().all()
+        session.add_all(ProjectChange(project_id=pk) for pk in project_ids)
+        session.commit()
+        for project_id in project_ids:
+            project_skill_index.remove(project_id)
+        total += len(project_ids)
+        if len(project_ids) < settings.MAINTENANCE_BATCH_SIZE:
+            if total:
+                project_facets.invalidate()
+            return total
+
+
+def purge_finished_jobs(session: Session) -> int:
+    return delete_in_batches(
+        session,
+        Job.id,
+        Job.status.in_([JobStatusEnum.done, JobStatusEnum.failed]),
+        Job.run_at < datetime.utcnow() - timedelta(days=settings.JOB_RETENTION_DAYS),
+    )
+
+
+def purge_old_project_changes(session: Session) -> int:
+    # cut at the newest expired position and keep that row, tokens before it
+    # are told to reload by /project/changes
+    boundary = session.exec(
+        select(ProjectChange.txid, ProjectChange.id)
+        .where(
+            ProjectChange.created_at
+            < datetime.utcnow() - timedelta(days=settings.PROJECT_CHANGE_RETENTION_DAYS)
+        )
+        .order_by(ProjectChange.txid.desc(), ProjectChange.id.desc())
+        .limit(1)
+    ).first()
+    if boundary is None:
+        return 0
+    return delete_in_batches(
+        session,
+        ProjectChange.id,
+        tuple_(ProjectChange.txid, ProjectChange.id) < tuple_(*boundary),
+    )
+
+
+class Scheduler:
+    # Runs maintenance jobs at fixed intervals on a daemon thread, each run
+    # with its own session. Jobs are set based and idempotent, so several
+    # workers running the same scheduler is harmless.
+    def __init__(self) -> None:
+        self.jobs: list[tuple[str, float, Callable[[Session], int]]] = []
+        self.metrics: dict[str, JobMetrics] = {}
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def add_job(self, name: str, interval: float, job: Callable[[Session], int]):
+        self.jobs.append((name, interval, job))
+        self.metrics[name] = JobMetrics()
+
+    def run_job(self, name: str, job: Callable[[Session], int]) -> int:
+        metrics = self.metrics[name]
+        started = time.monotonic()
+        metrics.runs += 1
+        metrics.last_run_at = datetime.utcnow()
+        with Session(get_engine()) as session:
+            try:
+                rows = job(session)
+            except Exception:
+                session.rollback()
+                metrics.failures += 1
+                logger.exception("maintenance job %s failed", name)
+                return 0
+        metrics.last_rows = rows
+        metrics.total_rows += rows
+        metrics.last_duration = time.monotonic() - started
+        logger.info(
+            "maintenance job %s processed %s rows in %.3fs",
+            name,
+            rows,
+            metrics.last_duration,
+        )
+        return rows
+
+    def run_once(self, names: list[str] | None = None) -> None:
+        for name, _, job in self.jobs:
+            if not names or name in names:
+                self.run_job(name, job)
+
+    def _run(self) -> None:
+        next_run = {name: 0.0 for name, _, _ in self.jobs}
+        while not self._stop.is_set():
+            now = time.monotonic()
+            for name, interval, job in self.jobs:
+                if next_run[name] <= now:
+                    self.run_job(name, job)
+                    next_run[name] = time.monotonic() + interval
+            self._stop.wait(min(next_run.values(), default=now + 60) - now)
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="maintenance", daemon=True
+            )
+            self._thread.start()
+
+    def run_forever(self) -> None:
+        # for the command line, blocks until interrupted
+        self.start()
+        try:
+            self._thread.join()
+        except KeyboardInterrupt:
+            self.stop()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+scheduler = Scheduler()
+scheduler.add_job(
+    "downgrade_expired_plans",
+    settings.PLAN_SWEEP_INTERVAL_SECONDS,
+    downgrade_expired_plans,
+)
+scheduler.add_job(
+    "purge_expired_verification_codes",
+    settings.PURGE_INTERVAL_SECONDS,
+    purge_expired_verification_codes,
+)
+scheduler.add_job(
+    "purge_expired_reset_tokens",
+    settings.PURGE_INTERVAL_SECONDS,
+    purge_expired_reset_tokens,
+)
+scheduler.add_job(
+    "expire_stale_projects",
+    settings.PURGE_INTERVAL_SECONDS,
+    expire_stale_projects,
+)
+scheduler.add_job(
+    "purge_finished_jobs",
+    settings.PURGE_INTERVAL_SECONDS,
+    purge_finished_jobs,
+)
+scheduler.add_job(
+    "purge_old_project_changes",
+    settings.PURGE_INTERVAL_SECONDS,
+    purge_old_project_changes,
+)
+scheduler.add_job(
+    "refresh_stale_freelancer_ranks",
+    settings.PURGE_INTERVAL_SECONDS,
+    refresh_stale_freelancer_ranks,
+)
+scheduler.add_job(
+    "refresh_daily_stats",
+    settings.STATS_INTERVAL_SECONDS,
+    refresh_daily_stats,
+)
+scheduler.add_job(
+    "create_message_partitions",
+    settings.MESSAGE_ARCHIVE_INTERVAL_SECONDS,
+    create_message_partitions,
+)
+scheduler.add_job(
+    "archive_message_partitions",
+    settings.MESSAGE_ARCHIVE_INTERVAL_SECONDS,
+    archive_message_partitions,
+)
+scheduler.add_job(
+    "index_messages",
+    settings.SEARCH_INDEX_INTERVAL_SECONDS,
+    index_messages,
+)
+
+
+def main():
+    # python -m api.core.maintenance [--loop] [job ...]
+    parser = argparse.ArgumentParser(description="run maintenance jobs")
+    parser.add_argument("jobs", nargs="*", help="job names, all jobs by default")
+    parser.add_argument(
+        "--loop", action="store_true", help="keep running on the job intervals"
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if args.loop:
+        if args.jobs:
+            scheduler.jobs = [job for job in scheduler.jobs if job[0] in args.jobs]
+        scheduler.run_forever()
+    else:
+        scheduler.run_once(args.jobs)
+        for name, metrics in scheduler.metrics.items():
+            if metrics.runs:
+                print(name, metrics.json())
+
+
+if __name__ == "__main__":
+    main()
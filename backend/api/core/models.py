@@ -1,12 +1,21 @@
 import secrets
 import string
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from typing import List, Optional
 
 from pydantic import EmailStr, root_validator
+from sqlalchemy import JSON, BigInteger, Column, Index, text
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlmodel import Field, Relationship, SQLModel
 
-from .types import RequestType
+from ..settings import settings
+from .types import (
+    BulkOutcomeEnum,
+    ChangeKindEnum,
+    JobStatusEnum,
+    RequestType,
+    StatMetricEnum,
+)
 
 
 class BaseModel(SQLModel):
@@ -59,7 +68,14 @@ class PickDoer(SQLModel):
     doer: UserShortOut
 
 
+class UserShortPage(SQLModel):
+    users: List[UserShortOut]
+    next: Optional[str] = None
+
+
 class User(BaseModel, UserBase, table=True):
+    __table_args__ = (Index("ix_user_created_at", "created_at"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     description: Optional[str] = None
     name: Optional[str] = None
@@ -68,7 +84,7 @@ class User(BaseModel, UserBase, table=True):
     offer_left: int = Field(default=0, gt=-1)
     plan_id: Optional[int] = Field(default=None, foreign_key="plan.id")
     plan: Optional["Plan"] = Relationship()
-    plan_expire_at: Optional[datetime] = None
+    plan_expire_at: Optional[datetime] = Field(default=None, index=True)
     hashed_password: str = Field(default=None, max_length=32)
     role_id: Optional[int] = Field(foreign_key="role.id")
     role: Optional["Role"] = Relationship()
@@ -76,6 +92,9 @@ class User(BaseModel, UserBase, table=True):
     is_verified: bool = False
     is_email_verified: bool = False
     is_superuser: bool = False
+    # denormalized, kept in step with Follower rows by /follow
+    followers_count: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
+    followings_count: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
     # projects: List["Project"] = Relationship(
     #     back_populates="owner",
     # )
@@ -248,6 +267,8 @@ class UserOut(UserBase):
     comments: List[CommentOut] = None
     technologies: List[TechnologyOut] = None
     star: Optional[int] = Field(default=0, nullable=False, gt=-1, lt=6)
+    followers_count: int = 0
+    followings_count: int = 0
 
 class UserFullOut(UserOut):
     id_number: Optional[str] = None
@@ -320,6 +341,22 @@ class OfferOut(SQLModel):
     offerer: UserShortOut
 
 
+class OfferListOut(OfferOut):
+    created_at: datetime
+    rating: Optional[float] = None
+
+
+class OfferPage(SQLModel):
+    offers: List[OfferListOut]
+    next: Optional[str] = None
+
+
+class OfferStats(SQLModel):
+    count: int = 0
+    min_price: Optional[int] = None
+    avg_price: Optional[float] = None
+
+
 class ProjectBase(SQLModel):
     id: Optional[int] = Field(default=None, primary_key=True)
     title: str
@@ -344,15 +381,42 @@ class ProjectList(ProjectBase):
     status: Optional["StatusOut"] = None
 
 
+class TechnologyFacet(TechnologyOut):
+    count: int
+
+
+class PriceBucket(SQLModel):
+    min_price: Optional[int] = None
+    max_price: Optional[int] = None
+    count: int
+
+
+class ProjectFacets(SQLModel):
+    technologies: List[TechnologyFacet] = []
+    prices: List[PriceBucket] = []
+
+
+class ProjectListWithFacets(SQLModel):
+    projects: List[ProjectList]
+    facets: ProjectFacets
+
+
 class ProjectOut(ProjectBase):
     technologies: List["TechnologyOut"] = None
-    offers: List[OfferOut] = None
+    offer_stats: Optional[OfferStats] = None
     doer: Optional[UserShortOut] = None
     owner: Optional[UserShortOut] = None
     status: Optional["StatusOut"] = None
 
 
 class Project(BaseModel, ProjectBase, table=True):
+    __table_args__ = (
+        Index("ix_project_status_id_expire_at", "status_id", "expire_at"),
+        Index("ix_project_owner_id_created_at", "owner_id", "created_at"),
+        Index("ix_project_created_at", "created_at"),
+        Index("ix_project_updated_at", "updated_at"),
+    )
+
     offers: List["Offer"] = Relationship(
         back_populates="project",
         sa_relationship_kwargs={"cascade": "all, delete-orphan"},
@@ -399,7 +463,9 @@ class UserVerificationCode(BaseModel, table=True):
     user_id: Optional[int] = Field(unique=True, foreign_key="user.id", nullable=False)
     user: Optional[User] = Relationship(back_populates="verification_code")
     expire_at: datetime = Field(
-        default_factory=lambda: datetime.utcnow() + timedelta(minutes=5), nullable=False
+        default_factory=lambda: datetime.utcnow() + timedelta(minutes=5),
+        nullable=False,
+        index=True,
     )
 
 
@@ -408,11 +474,15 @@ class ResetPasswordToken(BaseModel, table=True):
     user_id: int = Field(unique=True, foreign_key="user.id")
     user: User = Relationship(back_populates="reset_token")
     expire_at: datetime = Field(
-        default_factory=lambda: datetime.utcnow() + timedelta(minutes=5), nullable=False
+        default_factory=lambda: datetime.utcnow() + timedelta(minutes=5),
+        nullable=False,
+        index=True,
     )
 
 
 class Offer(BaseModel, table=True):
+    __table_args__ = (Index("ix_offer_created_at", "created_at"),)
+
     offerer_id: Optional[int] = Field(foreign_key="user.id", primary_key=True)
     offerer: User = Relationship()
     project_id: Optional[int] = Field(foreign_key="project.id", primary_key=True)
@@ -422,6 +492,12 @@ class Offer(BaseModel, table=True):
 
 
 class Follower(BaseModel, table=True):
+    # the primary key covers lookups by follower_id alone
+    __table_args__ = (
+        Index("ix_follower_follower_id_created_at", "follower_id", "created_at"),
+        Index("ix_follower_following_id_created_at", "following_id", "created_at"),
+    )
+
     follower_id: Optional[int] = Field(foreign_key="user.id", primary_key=True)
     follower: User = Relationship(
         sa_relationship_kwargs=dict(foreign_keys="[Follower.follower_id]"),
@@ -432,8 +508,43 @@ class Follower(BaseModel, table=True):
     )
 
 
+class FeedItem(SQLModel, table=True):
+    # fan-out rows of /feed, the primary key is its keyset. No foreign keys so
+    # deleting users and projects is not slowed down by the fan-out
+    user_id: int = Field(primary_key=True)
+    created_at: datetime = Field(primary_key=True)
+    project_id: int = Field(primary_key=True, index=True)
+
+
+class MessageOut(SQLModel):
+    id: int
+    from_user_id: int
+    to_user_id: int
+    text: str
+    is_read: bool = False
+    created_at: datetime
+
+
+class MessagePage(SQLModel):
+    messages: List[MessageOut]
+    next: Optional[str] = None
+
+
 class Message(BaseModel, table=True):
-    id: Optional[int] = Field(default=None, primary_key=True)
+    # range partitioned by month on created_at, cold months are moved to
+    # MessageArchive files by api.core.archive
+    __table_args__ = (
+        Index("ix_message_created_at", "created_at"),
+        Index(
+            "ix_message_conversation", "from_user_id", "to_user_id", "created_at", "id"
+        ),
+        Index("ix_message_to_user_id_id", "to_user_id", "id"),
+    )
+
+    id: Optional[int] = Field(
+        default=None, primary_key=True, sa_column_kwargs={"autoincrement": True}
+    )
+    created_at: datetime = Field(default_factory=datetime.utcnow, primary_key=True)
     from_user_id: Optional[int] = Field(nullable=False, foreign_key="user.id")
     from_user: User = Relationship(
         sa_relationship_kwargs=dict(foreign_keys="[Message.from_user_id]"),
@@ -446,10 +557,205 @@ class Message(BaseModel, table=True):
     is_read: bool = False
 
 
+class MessageSearch(SQLModel, table=True):
+    # one row per participant so a search only reads the user's own rows,
+    # filled behind the send path by api.core.search.index_messages
+    __table_args__ = (
+        Index(
+            "ix_messagesearch_user_id_document",
+            "user_id",
+            "document",
+            postgresql_using="gin",
+        ),
+        Index("ix_messagesearch_created_at", "created_at"),
+    )
+
+    user_id: int = Field(primary_key=True)
+    message_id: int = Field(primary_key=True)
+    other_user_id: int
+    created_at: datetime
+    document: str = Field(sa_column=Column(TSVECTOR, nullable=False))
+
+
+class MessageSearchHit(SQLModel):
+    id: int
+    created_at: datetime
+    from_user_id: int
+    other_user_id: int
+    rank: float
+    headline: str
+
+
+class MessageSearchPage(SQLModel):
+    hits: List[MessageSearchHit]
+    next: Optional[str] = None
+
+
+class Presence(SQLModel):
+    online: List[int]
+
+
+class MessageArchive(BaseModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    partition: str = Field(unique=True, max_length=50)
+    range_start: datetime
+    range_end: datetime
+    path: str
+    row_count: int = 0
+
+
+class MessageArchiveConversation(SQLModel, table=True):
+    # which archives hold a conversation and where its gzip member starts,
+    # user_low < user_high
+    user_low: int = Field(primary_key=True)
+    user_high: int = Field(primary_key=True)
+    archive_id: int = Field(foreign_key="messagearchive.id", primary_key=True)
+    row_count: int = 0
+    byte_offset: int = Field(sa_column=Column(BigInteger, nullable=False))
+    byte_length: int = Field(sa_column=Column(BigInteger, nullable=False))
+
+
 class Request(BaseModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: Optional[int] = Field(nullable=False, foreign_key="user.id")
     request_type: RequestType = RequestType.verification
     user: User = Relationship(back_populates="request")
     accepted: Optional[bool] = Field(None, nullable=True)
-    responded_at: datetime | None = Field(None)
\ No newline at end of file
+    responded_at: datetime | None = Field(None)
+
+
+class Job(BaseModel, table=True):
+    __table_args__ = (Index("ix_job_status_run_at", "status", "run_at"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    name: str = Field(max_length=50)
+    payload: dict = Field(default_factory=dict, sa_column=Column(JSON, nullable=False))
+    status: JobStatusEnum = JobStatusEnum.queued
+    attempts: int = 0
+    max_attempts: int = 5
+    run_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
+    locked_at: Optional[datetime] = None
+    last_error: Optional[str] = None
+
+
+class FreelancerRank(BaseModel, table=True):
+    # one row per freelancer skill, refreshed by rankings.refresh_freelancer_rank
+    __table_args__ = (
+        Index(
+            "ix_freelancerrank_technology_id_score",
+            "technology_id",
+            "score",
+            "user_id",
+        ),
+    )
+
+    technology_id: Optional[int] = Field(
+        default=None, foreign_key="technology.id", primary_key=True
+    )
+    user_id: Optional[int] = Field(
+        default=None, foreign_key="user.id", primary_key=True, index=True
+    )
+    score: float = 0
+    rating: float = 0
+    completed_count: int = 0
+    last_completed_at: Optional[datetime] = None
+
+
+class RankedFreelancer(SQLModel):
+    user: UserShortOut
+    score: float
+    rating: float
+    completed_count: int
+    last_completed_at: Optional[datetime] = None
+
+
+class ProjectChange(BaseModel, table=True):
+    # append only log read in (txid, id) order, the position of the last row
+    # read is the sync token of /project/changes. txid is the writing
+    # transaction, ids are taken at insert and can commit out of order.
+    __table_args__ = (
+        Index("ix_projectchange_created_at", "created_at"),
+        Index("ix_projectchange_txid_id", "txid", "id"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    txid: Optional[int] = Field(
+        default=None,
+        sa_column=Column(
+            BigInteger, nullable=False, server_default=text("txid_current()")
+        ),
+    )
+    project_id: int = Field(index=True)
+    kind: ChangeKindEnum = ChangeKindEnum.upsert
+
+
+class FeedPage(SQLModel):
+    projects: List[ProjectList]
+    next: Optional[str] = None
+
+
+class ProjectChangeOut(SQLModel):
+    id: int
+    deleted: bool = False
+    project: Optional[ProjectList] = None
+
+
+class ProjectChanges(SQLModel):
+    changes: List[ProjectChangeOut]
+    next: str
+    has_more: bool = False
+
+
+class BulkSelection(SQLModel):
+    # either explicit ids or the filters of the subclass
+    ids: Optional[List[int]] = Field(None, max_items=settings.BULK_MAX_IDS)
+
+    @root_validator
+    def validate_selection(cls, values):
+        filters = [
+            name
+            for name, field in cls.__fields__.items()
+            if name != "ids" and not field.required
+        ]
+        if values.get("ids") is None and all(
+            values.get(name) is None for name in filters
+        ):
+            raise ValueError("ids or a filter is required")
+        return values
+
+
+class BulkRequestSelection(BulkSelection):
+    created_before: Optional[datetime] = None
+
+
+class BulkRespondIn(BulkRequestSelection):
+    accept: bool
+
+
+class BulkUserSelection(BulkSelection):
+    is_verified: Optional[bool] = None
+    created_before: Optional[datetime] = None
+
+
+class BulkResult(SQLModel):
+    outcomes: dict[int, BulkOutcomeEnum]
+    counts: dict[BulkOutcomeEnum, int]
+
+
+class DailyStatOut(SQLModel):
+    metric: StatMetricEnum
+    day: date
+    dimension: str = ""
+    value: int = 0
+
+
+class DailyStat(DailyStatOut, table=True):
+    # rollups of /admin/stats, the primary key serves metric and day ranges
+    metric: StatMetricEnum = Field(primary_key=True)
+    day: date = Field(primary_key=True)
+    dimension: str = Field(default="", primary_key=True, max_length=50)
+
+
+class StatWatermark(SQLModel, table=True):
+    name: str = Field(primary_key=True, max_length=50)
+    last_at: datetime
@@ -0,0 +1,63 @@
+import asyncio
+import logging
+import threading
+from typing import Iterable
+
+from .connections import ConnectionManager
+
+logger = logging.getLogger(__name__)
+
+
+class ProjectNotifier:
+    # Collects newly posted projects per connected freelancer and pushes them
+    # over the chat websocket. Projects published for the same user between
+    # two flushes are coalesced into a single frame.
+    def __init__(
+        self,
+        manager: ConnectionManager,
+        interval: float,
+        batch_size: int,
+        max_projects: int,
+    ) -> None:
+        self.manager = manager
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_projects = max_projects
+        self._pending: dict[int, dict[int, dict]] = {}
+        self._lock = threading.Lock()
+
+    def publish(self, project: dict, user_ids: Iterable[int]) -> None:
+        # called from the request threadpool, users without a socket are
+        # skipped since they will see the project on their next listing
+        with self._lock:
+            for user_id in user_ids:
+                if not self.manager.is_connected(user_id):
+                    continue
+                projects = self._pending.setdefault(user_id, {})
+                projects[project["id"]] = project
+                if len(projects) > self.max_projects:
+                    del projects[next(iter(projects))]
+
+    async def flush(self) -> None:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        items = list(pending.items())
+        for start in range(0, len(items), self.batch_size):
+            await asyncio.gather(
+                *(
+                    self.manager.send_json(
+                        user_id,
+                        {"type": "projects", "projects": list(projects.values())},
+                    )
+                    for user_id, projects in items[start : start + self.batch_size]
+                )
+            )
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            # a failed flush loses its batch, not the notifier
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("flushing project notifications failed")
@@ -0,0 +1,98 @@
+import math
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete
+from sqlmodel import Session, func, select
+
+from ..settings import settings
+from .models import (
+    Comment,
+    FreelancerRank,
+    Project,
+    Role,
+    Status,
+    User,
+    UserTechnology,
+)
+from .types import ProjectStatusEnum, RoleEnum
+
+
+def freelancer_score(
+    rating: float, completed_count: int, last_completed_at: datetime | None
+) -> float:
+    # rating counts most, completed projects with diminishing returns, and
+    # recent work decays with a RANK_RECENCY_DAYS time constant
+    score = rating * 20 + 10 * math.log1p(completed_count)
+    if last_completed_at:
+        days = (datetime.utcnow() - last_completed_at).total_seconds() / 86400
+        score += 10 * math.exp(-days / settings.RANK_RECENCY_DAYS)
+    return score
+
+
+def refresh_freelancer_rank(session: Session, user_id: int) -> None:
+    # replaces the user's rows, the caller commits
+    session.exec(
+        delete(FreelancerRank)
+        .where(FreelancerRank.user_id == user_id)
+        .execution_options(synchronize_session=False)
+    )
+    is_freelancer = session.exec(
+        select(User.id).join(Role, User.role_id == Role.id).where(
+            User.id == user_id, Role.title == RoleEnum.freelancer
+        )
+    ).first()
+    if is_freelancer is None:
+        return
+    rating = session.exec(
+        select(func.avg(Comment.star)).where(Comment.to_user_id == user_id)
+    ).first()
+    completed_count, last_completed_at = session.exec(
+        select(func.count(Project.id), func.max(Project.finished_at))
+        .join(Status, Project.status_id == Status.id)
+        .where(Project.doer_id == user_id, Status.title == ProjectStatusEnum.done)
+    ).one()
+    rating = float(rating or 0)
+    score = freelancer_score(rating, completed_count, last_completed_at)
+    technology_ids = session.exec(
+        select(UserTechnology.technology_id).where(UserTechnology.user_id == user_id)
+    ).all()
+    for technology_id in technology_ids:
+        session.add(
+            FreelancerRank(
+                technology_id=technology_id,
+                user_id=user_id,
+                score=score,
+                rating=rating,
+                completed_count=completed_count,
+                last_completed_at=last_completed_at,
+            )
+        )
+
+
+def refresh_stale_freelancer_ranks(session: Session) -> int:
+    # recency decays even when nothing happens, so rows older than a day are
+    # rescored; freelancers that have no rows yet are ranked for the first time
+    stale = session.exec(
+        select(FreelancerRank.user_id)
+        .where(FreelancerRank.updated_at < datetime.utcnow() - timedelta(days=1))
+        .distinct()
+        .limit(settings.MAINTENANCE_BATCH_SIZE)
+    ).all()
+    unranked = session.exec(
+        select(UserTechnology.user_id)
+        .join(User, UserTechnology.user_id == User.id)
+        .join(Role, User.role_id == Role.id)
+        .where(
+            Role.title == RoleEnum.freelancer,
+            ~select(FreelancerRank.user_id)
+            .where(FreelancerRank.user_id == UserTechnology.user_id)
+            .exists(),
+        )
+        .distinct()
+        .limit(settings.MAINTENANCE_BATCH_SIZE)
+    ).all()
+    user_ids = set(stale) | set(unranked)
+    for user_id in user_ids:
+        refresh_freelancer_rank(session, user_id)
+        session.commit()
+    return len(user_ids)
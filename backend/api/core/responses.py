@@ -1,4 +1,7 @@
+import orjson
 from fastapi import HTTPException, status
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
 
 credentials_exception = HTTPException(
     status_code=status.HTTP_401_UNAUTHORIZED, detail="not authenticated"
@@ -15,6 +18,29 @@ invalid_data_exception = HTTPException(
 permission_exception = HTTPException(
     status_code=status.HTTP_403_FORBIDDEN, detail="permission denied"
 )
+gone_exception = HTTPException(
+    status_code=status.HTTP_410_GONE, detail="sync token expired"
+)
 server_exception = HTTPException(
     status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="server error"
 )
+
+
+def _orjson_default(obj):
+    if isinstance(obj, BaseModel):
+        return obj.dict(exclude_none=True)
+    raise TypeError
+
+
+def dumps(content) -> bytes:
+    return orjson.dumps(
+        content, default=_orjson_default, option=orjson.OPT_NON_STR_KEYS
+    )
+
+
+class FastJSONResponse(JSONResponse):
+    # Serializes already built output models with orjson. Returning it from an
+    # endpoint skips fastapi's response_model validation, so only use it where
+    # the content is built from the response model itself.
+    def render(self, content) -> bytes:
+        return dumps(content)
@@ -1,10 +1,10 @@
 import os
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from hashlib import md5
-from typing import List, Optional
+from typing import List, Optional, Union
 
 import aiofiles
-from fastapi import BackgroundTasks, Body, Depends, File, Query, UploadFile
+from fastapi import Body, Depends, File, Query, Response, UploadFile
 from fastapi import Request as ApiRequest
 from fastapi.responses import FileResponse, HTMLResponse, JSONResponse
 from fastapi.templating import Jinja2Templates
@@ -13,40 +13,87 @@ from fastapi_utils.cbv import cbv
 from fastapi_utils.inferring_router import InferringRouter
 from pydantic import EmailStr
 from slugify import slugify
+from sqlalchemy import Float, cast, delete, insert, literal
 from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.orm import aliased, joinedload, lazyload, noload, selectinload
+from sqlalchemy.sql.expression import tuple_
 from sqlalchemy.sql.operators import is_
 from sqlmodel import Session, and_, func, or_, select, update
 
 from ..settings import settings
+from .analytics import daily_stats
+from .archive import read_archived_messages
+from .bulk import delete_users, respond_to_requests, set_users_verified
+from .caching import (
+    MemoryCacheBackend,
+    ResponseCache,
+    collection_version,
+    conditional_response,
+    make_etag,
+)
+from .connections import ConnectionManager
+from .exports import export_response
+from .indexes import (
+    freelancer_skill_index,
+    price_bucket_bounds,
+    price_bucket_expression,
+    project_facets,
+    project_skill_index,
+    technology_index,
+)
+from .jobs import enqueue, queue_stats
+from .maintenance import JobMetrics, scheduler
 from .models import (
+    BulkRespondIn,
+    BulkResult,
+    BulkUserSelection,
     Comment,
     CommentIn,
+    DailyStatOut,
     Education,
     EducationOut,
     Experience,
     ExperienceOut,
+    FeedItem,
+    FeedPage,
     Follower,
+    FreelancerRank,
     Message,
+    MessageOut,
+    MessagePage,
+    MessageSearchPage,
     Offer,
     OfferCreate,
+    OfferListOut,
+    OfferPage,
+    OfferStats,
     PickDoer,
     Plan,
     PlanChange,
     PlanCreate,
     PlanUpdate,
+    Presence,
+    PriceBucket,
     Project,
+    ProjectChange,
+    ProjectChanges,
+    ProjectFacets,
     ProjectIn,
     ProjectList,
+    ProjectListWithFacets,
     ProjectOut,
     ProjectTechnology,
+    RankedFreelancer,
     Request,
     ResetPasswordToken,
     Role,
+    RoleOut,
     SampleProject,
     SampleProjectOut,
     Status,
     Technology,
     TechnologyCreate,
+    TechnologyFacet,
     TechnologyOut,
     User,
     UserCreate,
@@ -54,47 +101,313 @@ from .models import (
     UserLogin,
     UserOut,
     UserShortOut,
+    UserShortPage,
     UserShortWithId,
     UserTechnology,
     UserUpdate,
     UserVerificationCode,
 )
+from .notifications import ProjectNotifier
+from .rankings import refresh_freelancer_rank
 from .responses import (
+    FastJSONResponse,
     conflict_exception,
     credentials_exception,
+    gone_exception,
     invalid_data_exception,
     not_found_exception,
     permission_exception,
 )
+from .search import search_messages
 from .types import (
+    BulkOutcomeEnum,
+    ChangeKindEnum,
+    ExportFormatEnum,
+    OfferSortEnum,
+    OverflowPolicyEnum,
     PlanEnum,
     ProjectStatusEnum,
     RoleEnum,
     SortDirEnum,
     SortEnum,
     SortRequestEnum,
+    StatMetricEnum,
     UserSortEnum,
 )
 from .utils import (
     Auth,
-    ConnectionManager,
     authenticate_admin,
     authenticate_user,
     create_access_token,
+    decode_cursor,
+    encode_cursor,
+    from_orm_fields,
     get_session,
-    sendmail,
+    parse_fields,
     update_model,
     validate_user,
+    wants,
 )
 
 router = InferringRouter()
 authenticated_router = InferringRouter()
 admin_router = InferringRouter()
-connection_manager = ConnectionManager()
+connection_manager = ConnectionManager(
+    settings.WS_QUEUE_SIZE,
+    OverflowPolicyEnum(settings.WS_OVERFLOW_POLICY),
+    settings.WS_MAX_PER_USER,
+    settings.WS_HEARTBEAT_INTERVAL_SECONDS,
+    settings.WS_HEARTBEAT_TIMEOUT_SECONDS,
+    settings.WS_SEND_TIMEOUT_SECONDS,
+)
+project_notifier = ProjectNotifier(
+    connection_manager,
+    settings.NOTIFY_INTERVAL_SECONDS,
+    settings.NOTIFY_BATCH_SIZE,
+    settings.NOTIFY_MAX_PROJECTS,
+)
+project_list_cache = ResponseCache(
+    "project_list",
+    MemoryCacheBackend(settings.PROJECT_LIST_CACHE_SIZE),
+    settings.PROJECT_LIST_CACHE_TTL,
+)
 
 templates = Jinja2Templates(directory="backend/templates/")
 
 
+def project_technologies_map(
+    session: Session, project_ids: List[int]
+) -> dict[int, List[TechnologyOut]]:
+    technologies = {project_id: [] for project_id in project_ids}
+    if project_ids:
+        result = session.exec(
+            select(ProjectTechnology.project_id, Technology).where(
+                ProjectTechnology.technology_id == Technology.id,
+                ProjectTechnology.project_id.in_(project_ids),
+            )
+        )
+        for project_id, technology in result:
+            technologies[project_id].append(TechnologyOut.from_orm(technology))
+    return technologies
+
+
+def collect_project_list(
+    session: Session, result, fields: set[str] | None = None
+) -> List[dict]:
+    # rows are joined with technologies, so a project can repeat
+    projects = {}
+    for res in result:
+        pro = res[0]
+        projects.setdefault(pro.id, pro)
+    technologies = {}
+    if wants(fields, "technologies"):
+        technologies = project_technologies_map(session, list(projects))
+    return [
+        from_orm_fields(
+            ProjectList, pro, fields, technologies=technologies.get(pro.id)
+        )
+        for pro in projects.values()
+    ]
+
+
+def facet_counts_sql(
+    session: Session,
+    tech: List[str] | None,
+    title: str | None,
+    min_price: int,
+    max_price: int | None,
+    is_open: bool | None,
+) -> tuple[dict[int, int], list[int]]:
+    # filters the rollup can not answer, aggregated over the project table
+    where_clause = [Project.price_to >= min_price]
+    if max_price:
+        where_clause.append(Project.price_to <= max_price)
+    if is_open is not None:
+        unassigned = select(Status.id).where(
+            Status.title == ProjectStatusEnum.unassigned
+        )
+        where_clause.append(
+            Project.status_id.in_(unassigned)
+            if is_open
+            else Project.status_id.not_in(unassigned)
+        )
+    if title:
+        where_clause.append(Project.title.like("%" + title + "%"))
+    technologies = dict(
+        session.exec(
+            select(ProjectTechnology.technology_id, func.count())
+            .join(Project, ProjectTechnology.project_id == Project.id)
+            .where(*where_clause)
+            .group_by(ProjectTechnology.technology_id)
+        ).all()
+    )
+    if tech:
+        where_clause.append(
+            Project.id.in_(
+                select(ProjectTechnology.project_id)
+                .join(Technology, ProjectTechnology.technology_id == Technology.id)
+                .where(Technology.slug.in_(tech))
+            )
+        )
+    bucket = price_bucket_expression(Project.price_to)
+    prices = [0] * len(price_bucket_bounds())
+    for index, count in session.exec(
+        select(bucket, func.count()).where(*where_clause).group_by(bucket)
+    ):
+        prices[index] = count
+    return technologies, prices
+
+
+def record_project_change(
+    session: Session, project_id: int, kind: ChangeKindEnum = ChangeKindEnum.upsert
+):
+    # committed together with the change it describes
+    session.add(ProjectChange(project_id=project_id, kind=kind))
+
+
+def select_short_users():
+    # only the columns of UserShortOut, users are never loaded as entities
+    return select(User.id, User.email, User.name, Role.id, Role.title).outerjoin(
+        Role, User.role_id == Role.id
+    )
+
+
+def to_short_user(row) -> UserShortOut:
+    user_id, email, name, role_id, role_title = row[:5]
+    return UserShortOut(
+        id=user_id,
+        email=email,
+        name=name,
+        role=RoleOut(id=role_id, title=role_title) if role_id else None,
+    )
+
+
+def fan_out_project(session: Session, project: Project, owner: User):
+    # fan-out on write, followers of large accounts read their projects instead
+    if not owner.followers_count:
+        return
+    if owner.followers_count > settings.FEED_FANOUT_MAX_FOLLOWERS:
+        return
+    session.exec(
+        insert(FeedItem).from_select(
+            ["user_id", "created_at", "project_id"],
+            select(
+                Follower.follower_id, literal(project.created_at), literal(project.id)
+            ).where(Follower.following_id == owner.id),
+        )
+    )
+
+
+def bulk_result(outcomes: dict) -> BulkResult:
+    counts = {}
+    for outcome in outcomes.values():
+        counts[outcome] = counts.get(outcome, 0) + 1
+    return BulkResult(outcomes=outcomes, counts=counts)
+
+
+def adjust_follow_counts(
+    session: Session, follower_id: int, following_id: int, delta: int
+):
+    # rows are updated in id order so crossing follows cannot deadlock
+    for user_id, column in sorted(
+        ((follower_id, "followings_count"), (following_id, "followers_count"))
+    ):
+        session.exec(
+            update(User)
+            .where(User.id == user_id)
+            .values({column: getattr(User, column) + delta})
+            .execution_options(synchronize_session=False)
+        )
+
+
+def user_load_options(fields: set[str] | None) -> list:
+    options = []
+    for name, relation in (
+        ("educations", User.educations),
+        ("experiences", User.experiences),
+        ("sample_projects", User.sample_projects),
+    ):
+        options.append(
+            selectinload(relation) if wants(fields, name) else noload(relation)
+        )
+    if wants(fields, "comments"):
+        options += [
+            selectinload(User.comments)
+            .joinedload(Comment.from_user)
+            .joinedload(User.role),
+            selectinload(User.comments)
+            .joinedload(Comment.from_user)
+            .lazyload(User.comments),
+        ]
+    else:
+        options.append(noload(User.comments))
+    if wants(fields, "technologies"):
+        options.append(
+            selectinload(User.user_technologies).joinedload(UserTechnology.technology)
+        )
+    if wants(fields, "role"):
+        options.append(joinedload(User.role))
+    return options
+
+
+def project_load_options(fields: set[str] | None) -> list:
+    options = []
+    if wants(fields, "technologies"):
+        options.append(
+            selectinload(Project.project_technologies).joinedload(
+                ProjectTechnology.technology
+            )
+        )
+    options.append(noload(Project.offers))
+    for name, relation in (("owner", Project.owner), ("doer", Project.doer)):
+        if wants(fields, name):
+            options += [
+                joinedload(relation).joinedload(User.role),
+                joinedload(relation).lazyload(User.comments),
+            ]
+    if wants(fields, "status"):
+        options.append(joinedload(Project.status))
+    return options
+
+
+def project_detail_version(session: Session, project_id: int) -> tuple | None:
+    # the offer aggregates double as the offer_stats of the detail response
+    owner = aliased(User)
+    doer = aliased(User)
+    return session.exec(
+        select(
+            Project.updated_at,
+            owner.updated_at,
+            doer.updated_at,
+            func.max(Offer.updated_at),
+            func.count(Offer.offerer_id),
+            func.min(Offer.offer_price),
+            func.avg(Offer.offer_price),
+        )
+        .join(owner, Project.owner_id == owner.id)
+        .outerjoin(doer, Project.doer_id == doer.id)
+        .outerjoin(Offer, Offer.project_id == Project.id)
+        .where(Project.id == project_id)
+        .group_by(Project.id, owner.id, doer.id)
+    ).first()
+
+
+def build_user_out(session: Session, user: User, fields: set[str] | None) -> dict:
+    extra = {}
+    if wants(fields, "technologies"):
+        extra["technologies"] = [
+            TechnologyOut.from_orm(tech.technology) for tech in user.user_technologies
+        ]
+    if wants(fields, "star"):
+        avg_star = session.exec(
+            select(func.avg(Comment.star).label("average")).where(
+                Comment.to_user_id == user.id
+            )
+        ).first()
+        extra["star"] = int(avg_star) if avg_star else 0
+    return from_orm_fields(UserOut, user, fields, **extra)
+
+
 @cbv(router)
 class Router:
     session: Session = Depends(get_session)
@@ -109,7 +422,7 @@ class Router:
         status_code=201,
         response_model_exclude_none=True,
     )
-    def create_user(self, user_in: UserCreate, background_task: BackgroundTasks):
+    def create_user(self, user_in: UserCreate):
         plan = self.session.exec(
             select(Plan).where(Plan.title == PlanEnum.free)
         ).first()
@@ -131,7 +444,12 @@ class Router:
             user.offer_left = plan.offer_number
             self.session.add(user)
             verification_code = UserVerificationCode(user=user)
-            background_task.add_task(sendmail, user_in.email, verification_code.code)
+            enqueue(
+                self.session,
+                "sendmail",
+                recipient=user_in.email,
+                body=verification_code.code,
+            )
             self.session.add(verification_code)
             self.session.commit()
             self.session.refresh(user)
@@ -143,7 +461,7 @@ class Router:
     @router.post(
         "/verify/resend",
     )
-    def resend_verify_code(self, user_id: int, background_task: BackgroundTasks):
+    def resend_verify_code(self, user_id: int):
         try:
             user = self.session.get(User, user_id)
             if user is None:
@@ -151,7 +469,12 @@ class Router:
             if user.is_email_verified:
                 raise permission_exception
             verification_code = UserVerificationCode(user_id=user_id)
-            background_task.add_task(sendmail, user.email, verification_code.code)
+            enqueue(
+                self.session,
+                "sendmail",
+                recipient=user.email,
+                body=verification_code.code,
+            )
             self.session.add(verification_code)
             self.session.commit()
             return JSONResponse(status_code=200, content={})
@@ -159,21 +482,16 @@ class Router:
             raise conflict_exception
 
     @router.get("/user", response_model=UserOut, response_model_exclude_none=True)
-    def get_user_info(self, user_id: int):
-        user = self.session.get(User, user_id)
+    def get_user_info(self, user_id: int, fields: List[str] | None = Query(None)):
+        fields = parse_fields(UserOut, fields)
+        user = self.session.exec(
+            select(User)
+            .where(User.id == user_id)
+            .options(*user_load_options(fields))
+        ).first()
         if user is None:
             raise not_found_exception
-        avg_star = self.session.exec(
-            select(func.avg(Comment.star).label("average")).where(
-                Comment.to_user_id == user_id
-            )
-        ).first()
-        user_out = UserOut.from_orm(user)
-        user_out.technologies = []
-        for tech in user.user_technologies:
-            user_out.technologies.append(tech.technology)
-        user_out.star = avg_star if avg_star else 0
-        return user_out
+        return FastJSONResponse(build_user_out(self.session, user, fields))
 
     @router.post("/login")
     def login(self, user_in: UserLogin):
@@ -212,9 +530,7 @@ class Router:
             raise invalid_data_exception
 
     @router.post("/password/forgot")
-    def send_reset_password_token(
-        *, self, email: EmailStr = Body(embed=True), background_task: BackgroundTasks
-    ):
+    def send_reset_password_token(self, email: EmailStr = Body(embed=True)):
         user = self.session.exec(select(User).where(User.email == email)).first()
         if user:
             past_token = self.session.exec(
@@ -226,7 +542,7 @@ class Router:
                 self.session.delete(token)
 
             reset_token = ResetPasswordToken(user=user)
-            background_task.add_task(sendmail, email, reset_token.token)
+            enqueue(self.session, "sendmail", recipient=email, body=reset_token.token)
             self.session.add(reset_token)
             self.session.commit()
             return JSONResponse(status_code=200, content={})
@@ -270,15 +586,194 @@ class Router:
             raise invalid_data_exception
 
     @router.get("/role", response_model=List[Role])
-    def list_roles(self):
-        return self.session.exec(select(Role).where(Role.title != RoleEnum.admin)).all()
+    def list_roles(self, request: ApiRequest):
+        where_clause = [Role.title != RoleEnum.admin]
+        etag = make_etag(*collection_version(self.session, Role, *where_clause))
+        return conditional_response(
+            request,
+            "/role",
+            etag,
+            lambda: [
+                role.dict()
+                for role in self.session.exec(select(Role).where(*where_clause))
+            ],
+        )
 
     @router.get("/plan", response_model=List[Plan])
-    def list_plans(self):
-        return self.session.exec(select(Plan)).all()
+    def list_plans(self, request: ApiRequest):
+        etag = make_etag(*collection_version(self.session, Plan))
+        return conditional_response(
+            request,
+            "/plan",
+            etag,
+            lambda: [plan.dict() for plan in self.session.exec(select(Plan))],
+        )
 
     @router.get(
-        "/project", response_model=List[ProjectList], response_model_exclude_none=True
+        "/users/batch",
+        response_model=List[UserShortOut],
+        response_model_exclude_none=True,
+    )
+    def get_users_batch(
+        self, ids: List[int] = Query(..., max_items=settings.BATCH_MAX_IDS)
+    ):
+        users = {
+            row[0]: to_short_user(row)
+            for row in self.session.exec(
+                select_short_users().where(User.id.in_(set(ids)))
+            )
+        }
+        return FastJSONResponse(
+            [users[user_id] for user_id in dict.fromkeys(ids) if user_id in users]
+        )
+
+    @router.get(
+        "/projects/batch",
+        response_model=List[ProjectList],
+        response_model_exclude_none=True,
+    )
+    def get_projects_batch(
+        self,
+        ids: List[int] = Query(..., max_items=settings.BATCH_MAX_IDS),
+        fields: List[str] | None = Query(None),
+    ):
+        fields = parse_fields(ProjectList, fields)
+        result = self.session.exec(
+            select(Project, Status).where(
+                Project.status_id == Status.id, Project.id.in_(set(ids))
+            )
+        )
+        projects = {
+            project["id"]: project
+            for project in collect_project_list(self.session, result, fields)
+        }
+        return FastJSONResponse(
+            [projects[pk] for pk in dict.fromkeys(ids) if pk in projects]
+        )
+
+    @router.get(
+        "/project/changes",
+        response_model=ProjectChanges,
+        response_model_exclude_none=True,
+    )
+    def list_project_changes(
+        self, since: str | None = None, limit: int = Query(100, gt=0, lt=1001)
+    ):
+        # Only changes of transactions older than the oldest running one are
+        # read, anything that commits later sorts after them. Without a token
+        # only the current position is returned, clients load the listing
+        # once and then poll with the token.
+        horizon = self.session.exec(
+            select(func.txid_snapshot_xmin(func.txid_current_snapshot()))
+        ).one()
+        if since is None:
+            return FastJSONResponse(
+                ProjectChanges(changes=[], next=encode_cursor(horizon, 0))
+            )
+        since_position = tuple(decode_cursor(since, int, int))
+        oldest = self.session.exec(
+            select(ProjectChange.txid, ProjectChange.id, ProjectChange.created_at)
+            .order_by(ProjectChange.txid, ProjectChange.id)
+            .limit(1)
+        ).first()
+        # the purge keeps the row it cut at, an expired oldest row is that one
+        if (
+            oldest is not None
+            and since_position < (oldest.txid, oldest.id)
+            and oldest.created_at
+            < datetime.utcnow() - timedelta(days=settings.PROJECT_CHANGE_RETENTION_DAYS)
+        ):
+            raise gone_exception
+        changes = self.session.exec(
+            select(ProjectChange)
+            .where(
+                tuple_(ProjectChange.txid, ProjectChange.id) > tuple_(*since_position),
+                ProjectChange.txid < horizon,
+            )
+            .order_by(ProjectChange.txid, ProjectChange.id)
+            .limit(limit + 1)
+        ).all()
+        has_more = len(changes) > limit
+        changes = changes[:limit]
+        # a full page resumes after its last row, otherwise everything below
+        # the horizon has been read
+        if has_more:
+            next_position = (changes[-1].txid, changes[-1].id)
+        else:
+            next_position = max(since_position, (horizon, 0))
+        # only the last change of each project matters, ordered by that change
+        latest = {}
+        for change in changes:
+            latest.pop(change.project_id, None)
+            latest[change.project_id] = change.kind
+        upserts = [pk for pk, kind in latest.items() if kind == ChangeKindEnum.upsert]
+        projects = {}
+        if upserts:
+            result = self.session.exec(
+                select(Project, Status).where(
+                    Project.status_id == Status.id, Project.id.in_(upserts)
+                )
+            )
+            projects = {
+                project["id"]: project
+                for project in collect_project_list(self.session, result)
+            }
+        return FastJSONResponse(
+            {
+                "changes": [
+                    {"id": pk, "project": projects[pk]}
+                    if pk in projects
+                    else {"id": pk, "deleted": True}
+                    for pk in latest
+                ],
+                "next": encode_cursor(*next_position),
+                "has_more": has_more,
+            }
+        )
+
+    @router.get(
+        "/technology/top-freelancers",
+        response_model=List[RankedFreelancer],
+        response_model_exclude_none=True,
+    )
+    def list_top_freelancers(
+        self,
+        technology_id: int,
+        page: int = 1,
+        limit: int = Query(10, lt=51),
+    ):
+        result = self.session.exec(
+            select_short_users()
+            .add_columns(
+                FreelancerRank.score,
+                FreelancerRank.rating,
+                FreelancerRank.completed_count,
+                FreelancerRank.last_completed_at,
+            )
+            .join(FreelancerRank, FreelancerRank.user_id == User.id)
+            .where(FreelancerRank.technology_id == technology_id)
+            # both descending, a backward scan of the technology_id index
+            .order_by(FreelancerRank.score.desc(), FreelancerRank.user_id.desc())
+            .offset((page - 1) * limit)
+            .limit(limit)
+        )
+        return FastJSONResponse(
+            [
+                RankedFreelancer(
+                    user=to_short_user(row),
+                    score=row[5],
+                    rating=row[6],
+                    completed_count=row[7],
+                    last_completed_at=row[8],
+                )
+                for row in result
+            ]
+        )
+
+    @router.get(
+        "/project",
+        response_model=Union[List[ProjectList], ProjectListWithFacets],
+        response_model_exclude_none=True,
     )
     def list_projects(
         self,
@@ -291,7 +786,88 @@ class Router:
         is_open: Optional[bool] = Query(None, alias="open"),
         page: int = 1,
         limit: int = Query(10, lt=51),
+        fields: List[str] | None = Query(None),
+        facets: bool = False,
     ):
+        # anonymous and shared by many visitors, so the rendered page is cached
+        fields = parse_fields(ProjectList, fields)
+        params = dict(
+            tech=tech,
+            title=title,
+            sort=sort,
+            sort_dir=sort_dir,
+            min_price=min_price,
+            max_price=max_price,
+            is_open=is_open,
+            page=page,
+            limit=limit,
+            fields=fields,
+        )
+
+        def render():
+            projects = self.query_projects(**params)
+            if not facets:
+                return FastJSONResponse(projects).body
+            return FastJSONResponse(
+                {
+                    "projects": projects,
+                    "facets": self.query_facets(
+                        tech, title, min_price, max_price, is_open
+                    ),
+                }
+            ).body
+
+        body = project_list_cache.get_or_compute(
+            project_list_cache.key(facets=facets, **params), render
+        )
+        return Response(content=body, media_type="application/json")
+
+    def query_facets(
+        self,
+        tech: List[str] | None,
+        title: str | None,
+        min_price: int,
+        max_price: int | None,
+        is_open: bool | None,
+    ) -> ProjectFacets:
+        technology_index.ensure_loaded(self.session)
+        tech_ids = technology_index.ids_for_slugs(tech) if tech else set()
+        if title or (tech and len(tech_ids) != 1):
+            technologies, prices = facet_counts_sql(
+                self.session, tech, title, min_price, max_price, is_open
+            )
+        else:
+            project_facets.ensure_loaded(self.session)
+            technologies, prices = project_facets.facets(
+                is_open, min_price, max_price, next(iter(tech_ids), None)
+            )
+        return ProjectFacets(
+            technologies=[
+                TechnologyFacet(**technology_index.get(tech_id), count=count)
+                for tech_id, count in sorted(
+                    technologies.items(), key=lambda item: -item[1]
+                )
+                if count and technology_index.get(tech_id)
+            ],
+            prices=[
+                PriceBucket(min_price=low, max_price=high, count=count)
+                for (low, high), count in zip(price_bucket_bounds(), prices)
+            ],
+        )
+
+    def query_projects(
+        self,
+        tech: List[str] | None,
+        title: str | None,
+        sort: SortEnum,
+        sort_dir: SortDirEnum,
+        min_price: Optional[int],
+        max_price: Optional[int],
+        is_open: Optional[bool],
+        page: int,
+        limit: int,
+        fields: set[str] | None,
+    ) -> List[dict]:
         select_clause = [Project, Status]
         where_clause = [
             Project.status_id == Status.id,
@@ -347,28 +923,7 @@ class Router:
                 )
             )
         )
-        projects = []
-        current_project = None
-        for res in result:
-            pro = res[0]
-            if current_project is None:
-                current_project = ProjectList.from_orm(pro)
-                current_project.technologies = []
-                for t in pro.project_technologies:
-                    current_project.technologies.append(t.technology)
-
-                last_id = pro.id
-                projects.append(current_project)
-
-            elif pro.id != last_id:
-                current_project = ProjectList.from_orm(pro)
-                current_project.technologies = []
-                for t in pro.project_technologies:
-                    current_project.technologies.append(t.technology)
-                projects.append(current_project)
-                last_id = current_project.id
-
-        return projects
+        return collect_project_list(self.session, result, fields)
 
 
 @cbv(authenticated_router)
@@ -378,18 +933,11 @@ class AuthenticatedRouter:
     @authenticated_router.get(
         "/user/detail", response_model=UserOut, response_model_exclude_none=True
     )
-    def get_user_detail(self):
-        avg_star = self.auth.session.exec(
-            select(func.avg(Comment.star).label("average")).where(
-                Comment.to_user_id == self.auth.user.id
-            )
-        ).first()
-        user_out = UserOut.from_orm(self.auth.user)
-        user_out.technologies = []
-        for tech in self.auth.user.user_technologies:
-            user_out.technologies.append(tech.technology)
-        user_out.star = avg_star if avg_star else 0
-        return user_out
+    def get_user_detail(self, fields: List[str] | None = Query(None)):
+        fields = parse_fields(UserOut, fields)
+        return FastJSONResponse(
+            build_user_out(self.auth.session, self.auth.user, fields)
+        )
 
     @authenticated_router.get(
         "/request/validation",
@@ -421,6 +969,7 @@ class AuthenticatedRouter:
     def delete_user(self):
         self.auth.session.delete(self.auth.user)
         self.auth.session.commit()
+        freelancer_skill_index.remove(self.auth.user.id)
         return JSONResponse(status_code=200, content={})
 
     @authenticated_router.post(
@@ -453,7 +1002,29 @@ class AuthenticatedRouter:
                             TechnologyOut.from_orm(project_tech.technology)
                         )
 
+            self.auth.session.flush()
+            record_project_change(self.auth.session, project.id)
+            fan_out_project(self.auth.session, project, self.auth.user)
             self.auth.session.commit()
+            project_list_cache.invalidate()
+            technology_ids = [technology.id for technology in project_technologies]
+            project_facets.add(
+                ProjectStatusEnum.unassigned, project.price_to, technology_ids
+            )
+            project_skill_index.add(
+                project.id,
+                project.created_at,
+                project.price_to,
+                project.title,
+                technology_ids,
+            )
+            freelancer_skill_index.ensure_loaded(self.auth.session)
+            project_notifier.publish(
+                from_orm_fields(
+                    ProjectList, project, None, technologies=project_technologies
+                ),
+                freelancer_skill_index.match(technology_ids) - {self.auth.user.id},
+            )
             project_out = ProjectOut.from_orm(project)
             project_out.technologies = project_technologies
             return project_out
@@ -474,7 +1045,9 @@ class AuthenticatedRouter:
         is_open: Optional[bool] = Query(None, alias="open"),
         page: int = 1,
         limit: int = Query(10, lt=51),
+        fields: List[str] | None = Query(None),
     ):
+        fields = parse_fields(ProjectList, fields)
         where_clause = [Project.doer == self.auth.user]
         if title:
             where_clause.append(
@@ -503,28 +1076,9 @@ class AuthenticatedRouter:
                 )
             )
         )
-        projects = []
-        current_project = None
-        for res in result:
-            pro = res[0]
-            if current_project is None:
-                current_project = ProjectList.from_orm(pro)
-                current_project.technologies = []
-                for t in pro.project_technologies:
-                    current_project.technologies.append(t.technology)
-
-                last_id = pro.id
-                projects.append(current_project)
-
-            elif pro.id != last_id:
-                current_project = ProjectList.from_orm(pro)
-                current_project.technologies = []
-                for t in pro.project_technologies:
-                    current_project.technologies.append(t.technology)
-                projects.append(current_project)
-                last_id = current_project.id
-
-        return projects
+        return FastJSONResponse(
+            collect_project_list(self.auth.session, result, fields)
+        )
 
     @authenticated_router.get(
         "/my/projects",
@@ -539,7 +1093,9 @@ class AuthenticatedRouter:
         is_open: Optional[bool] = Query(None, alias="open"),
         page: int = 1,
         limit: int = Query(10, lt=51),
+        fields: List[str] | None = Query(None),
     ):
+        fields = parse_fields(ProjectList, fields)
         where_clause = [Project.owner == self.auth.user]
         if title:
             where_clause.append(
@@ -568,28 +1124,9 @@ class AuthenticatedRouter:
                 )
             )
         )
-        projects = []
-        current_project = None
-        for res in result:
-            pro = res[0]
-            if current_project is None:
-                current_project = ProjectList.from_orm(pro)
-                current_project.technologies = []
-                for t in pro.project_technologies:
-                    current_project.technologies.append(t.technology)
-
-                last_id = pro.id
-                projects.append(current_project)
-
-            elif pro.id != last_id:
-                current_project = ProjectList.from_orm(pro)
-                current_project.technologies = []
-                for t in pro.project_technologies:
-                    current_project.technologies.append(t.technology)
-                projects.append(current_project)
-                last_id = current_project.id
-
-        return projects
+        return FastJSONResponse(
+            collect_project_list(self.auth.session, result, fields)
+        )
 
     @authenticated_router.get(
         "/project/me",
@@ -604,178 +1141,345 @@ class AuthenticatedRouter:
         sort_dir: SortDirEnum = SortDirEnum.descending,
         min_price: Optional[int] = 0,
         max_price: Optional[int] = None,
-        is_open: Optional[bool] = Query(None, alias="open"),
         page: int = 1,
         limit: int = Query(10, lt=51),
+        fields: List[str] | None = Query(None),
     ):
-        select_clause = [Project, Status]
-        where_clause = [
-            Project.status_id == Status.id,
-            Project.price_to >= min_price,
-        ]
-        techs = self.auth.session.exec(
-            select(UserTechnology).where(UserTechnology.user == self.auth.user)
-        ).all()
-        where_clause.append(
-            Technology.id.in_(map(lambda t: t.technology_id, techs)),
-        )
-        second_where_clause = [
-            Project.price_to >= min_price,
-        ]
-        if max_price:
-            where_clause.append(
-                Project.price_to <= max_price,
+        # open projects ranked by the number of skills they share with the user
+        fields = parse_fields(ProjectList, fields)
+        project_skill_index.ensure_loaded(self.auth.session)
+        ranked_ids = project_skill_index.match(
+            [tech.technology_id for tech in self.auth.user.user_technologies],
+            page * limit,
+            title=title,
+            min_price=min_price,
+            max_price=max_price,
+            sort=sort,
+            sort_dir=sort_dir,
+        )[(page - 1) * limit :]
+        result = self.auth.session.exec(
+            select(Project, Status).where(
+                Project.status_id == Status.id,
+                Project.id.in_(ranked_ids),
+                Status.title == ProjectStatusEnum.unassigned,
             )
-            second_where_clause.append(
-                Project.price_to <= max_price,
+        )
+        projects = {
+            project["id"]: project
+            for project in collect_project_list(self.auth.session, result, fields)
+        }
+        for project_id in ranked_ids:
+            # assigned or deleted by another worker since the last reload
+            if project_id not in projects:
+                project_skill_index.remove(project_id)
+        return FastJSONResponse(
+            [projects[pk] for pk in ranked_ids if pk in projects]
+        )
+
+    @authenticated_router.get(
+        "/project/detail", response_model=ProjectOut, response_model_exclude_none=True
+    )
+    def get_project_detail(
+        self,
+        request: ApiRequest,
+        project_id: int,
+        fields: List[str] | None = Query(None),
+    ):
+        fields = parse_fields(ProjectOut, fields)
+        version = project_detail_version(self.auth.session, project_id)
+        if version is None:
+            raise not_found_exception
+
+        def build():
+            project = self.auth.session.exec(
+                select(Project)
+                .where(Project.id == project_id)
+                .options(*project_load_options(fields))
+            ).first()
+            if project is None:
+                raise not_found_exception
+            technologies = None
+            if wants(fields, "technologies"):
+                technologies = [
+                    TechnologyOut.from_orm(tech_project.technology)
+                    for tech_project in project.project_technologies
+                ]
+            count, min_price, avg_price = version[-3:]
+            offer_stats = OfferStats(
+                count=count,
+                min_price=min_price,
+                avg_price=float(avg_price) if avg_price is not None else None,
             )
-        if is_open is not None:
-            open_clause = (
-                Status.title == ProjectStatusEnum.unassigned
-                if is_open
-                else Status.title != ProjectStatusEnum.unassigned
+            return from_orm_fields(
+                ProjectOut,
+                project,
+                fields,
+                technologies=technologies,
+                offer_stats=offer_stats,
             )
-            where_clause.append(open_clause)
-            second_where_clause.append(open_clause)
 
-        if techs:
-            where_clause += [
-                Project.id == ProjectTechnology.project_id,
-                Technology.id == ProjectTechnology.technology_id,
-                Technology.id.in_(map(lambda t: t.technology_id, techs)),
-            ]
-            select_clause += [ProjectTechnology, Technology]
+        etag = make_etag(project_id, sorted(fields or []), *version)
+        return conditional_response(request, "/project/detail", etag, build)
 
-        if title:
-            where_clause.append(
-                Project.title.like("%" + title + "%"),
+    @authenticated_router.get("/project/offers", response_model=OfferPage)
+    def list_project_offers(
+        self,
+        project_id: int,
+        sort: OfferSortEnum = OfferSortEnum.price,
+        sort_dir: SortDirEnum = SortDirEnum.ascending,
+        cursor: str | None = None,
+        limit: int = Query(20, gt=0, lt=101),
+    ):
+        offerers = select(Offer.offerer_id).where(Offer.project_id == project_id)
+        ratings = (
+            select(
+                Comment.to_user_id.label("user_id"),
+                func.avg(Comment.star).label("rating"),
             )
-            second_where_clause.append(
-                Project.title.like("%" + title + "%"),
+            .where(Comment.to_user_id.in_(offerers))
+            .group_by(Comment.to_user_id)
+            .subquery()
+        )
+        # avg is a numeric, as a double it round trips through the cursor and
+        # the keyset compares the last row equal to itself
+        rating = cast(func.coalesce(ratings.c.rating, 0), Float(53))
+        sort_column = {
+            OfferSortEnum.price: Offer.offer_price,
+            OfferSortEnum.duration: Offer.duration_day,
+            OfferSortEnum.rating: rating,
+        }[sort]
+        query = (
+            select(Offer, User, Role, rating)
+            .join(User, Offer.offerer_id == User.id)
+            .outerjoin(Role, User.role_id == Role.id)
+            .outerjoin(ratings, ratings.c.user_id == Offer.offerer_id)
+            .where(Offer.project_id == project_id)
+            .options(lazyload(User.comments))
+        )
+        if cursor:
+            # keyset on (sort column, offerer id), unique within a project
+            last_value, last_id = decode_cursor(
+                cursor, float if sort == OfferSortEnum.rating else int, int
             )
-
+            key = tuple_(sort_column, Offer.offerer_id)
+            if sort_dir == SortDirEnum.ascending:
+                query = query.where(key > tuple_(last_value, last_id))
+            else:
+                query = query.where(key < tuple_(last_value, last_id))
         result = self.auth.session.exec(
-            select(*select_clause)
-            .where(*where_clause)
-            .order_by(getattr(getattr(Project, sort.value), sort_dir.value)())
-            .where(
-                Project.id.in_(
-                    select(Project.id)
-                    .join(Status)
-                    .where(*second_where_clause)
-                    .order_by(getattr(getattr(Project, sort.value), sort_dir.value)())
-                    .offset((page - 1) * limit)
-                    .limit(limit)
+            query.order_by(
+                getattr(sort_column, sort_dir.value)(),
+                getattr(Offer.offerer_id, sort_dir.value)(),
+            ).limit(limit + 1)
+        ).all()
+        offers = []
+        for offer, user, role, offerer_rating in result[:limit]:
+            offers.append(
+                OfferListOut(
+                    offer_price=offer.offer_price,
+                    duration_day=offer.duration_day,
+                    created_at=offer.created_at,
+                    rating=float(offerer_rating),
+                    offerer=UserShortOut(
+                        id=user.id,
+                        email=user.email,
+                        name=user.name,
+                        role=role,
+                    ),
                 )
             )
-        )
-        projects = []
-        current_project = None
-        for res in result:
-            pro = res[0]
-            if current_project is None:
-                current_project = ProjectList.from_orm(pro)
-                current_project.technologies = []
-                for t in pro.project_technologies:
-                    current_project.technologies.append(t.technology)
-
-                last_id = pro.id
-                projects.append(current_project)
-
-            elif pro.id != last_id:
-                current_project = ProjectList.from_orm(pro)
-                current_project.technologies = []
-                for t in pro.project_technologies:
-                    current_project.technologies.append(t.technology)
-                projects.append(current_project)
-                last_id = current_project.id
-
-        return projects
-
-    @authenticated_router.get(
-        "/project/detail", response_model=ProjectOut, response_model_exclude_none=True
-    )
-    def get_project_detail(self, project_id: int):
-        project = self.auth.session.get(Project, project_id)
-        if project:
-            technologies = []
-            for tech_project in project.project_technologies:
-                technologies.append(TechnologyOut.from_orm(tech_project.technology))
-            project_out = ProjectOut.from_orm(project)
-            project_out.technologies = technologies
-            return project_out
-        else:
-            raise not_found_exception
+        next_cursor = None
+        if len(result) > limit:
+            last = offers[-1]
+            last_value = {
+                OfferSortEnum.price: last.offer_price,
+                OfferSortEnum.duration: last.duration_day,
+                OfferSortEnum.rating: last.rating,
+            }[sort]
+            next_cursor = encode_cursor(last_value, last.offerer.id)
+        return FastJSONResponse(OfferPage(offers=offers, next=next_cursor))
 
     @authenticated_router.post(
         "/follow",
         response_model=UserShortOut,
     )
     def add_followings(self, user_id: int):
+        if user_id == self.auth.user.id:
+            raise permission_exception
         try:
-            if user_id == self.auth.user.id:
-                raise permission_exception
-
-            follow = Follower(follower=self.auth.user, following_id=user_id)
-            self.auth.session.add(follow)
-            self.auth.session.commit()
-            self.auth.session.refresh(follow)
-            return follow.following
+            self.auth.session.add(
+                Follower(follower_id=self.auth.user.id, following_id=user_id)
+            )
+            self.auth.session.flush()
         except IntegrityError:
             raise not_found_exception
+        adjust_follow_counts(self.auth.session, self.auth.user.id, user_id, 1)
+        self.auth.session.commit()
+        row = self.auth.session.exec(
+            select_short_users().where(User.id == user_id)
+        ).one()
+        return FastJSONResponse(to_short_user(row))
 
     @authenticated_router.delete(
         "/follow",
         response_model=UserShortOut,
     )
     def remove_followings(self, user_id: int):
-        try:
-            follow = self.auth.session.exec(
-                select(Follower).where(
-                    Follower.follower == self.auth.user,
-                    Follower.following_id == user_id,
+        result = self.auth.session.exec(
+            delete(Follower).where(
+                Follower.follower_id == self.auth.user.id,
+                Follower.following_id == user_id,
+            )
+        )
+        if not result.rowcount:
+            raise not_found_exception
+        adjust_follow_counts(self.auth.session, self.auth.user.id, user_id, -1)
+        self.auth.session.exec(
+            delete(FeedItem).where(
+                FeedItem.user_id == self.auth.user.id,
+                FeedItem.project_id.in_(
+                    select(Project.id).where(Project.owner_id == user_id)
+                ),
+            )
+        )
+        self.auth.session.commit()
+        return JSONResponse(status_code=200, content={})
+
+    def follow_page(
+        self, key, other, user_id: int | None, cursor: str | None, limit: int
+    ) -> UserShortPage:
+        # newest follows first, keyset on (created_at, user id)
+        query = (
+            select_short_users()
+            .add_columns(Follower.created_at)
+            .join(Follower, other == User.id)
+            .where(key == (user_id or self.auth.user.id))
+        )
+        if cursor:
+            last_created_at, last_id = decode_cursor(cursor, datetime, int)
+            query = query.where(
+                tuple_(Follower.created_at, User.id)
+                < tuple_(last_created_at, last_id)
+            )
+        rows = self.auth.session.exec(
+            query.order_by(Follower.created_at.desc(), User.id.desc()).limit(
+                limit + 1
+            )
+        ).all()
+        next_cursor = None
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            next_cursor = encode_cursor(last.created_at, last[0])
+        return UserShortPage(
+            users=[to_short_user(row) for row in rows[:limit]], next=next_cursor
+        )
+
+    @authenticated_router.get(
+        "/feed",
+        response_model=FeedPage,
+        response_model_exclude_none=True,
+    )
+    def list_feed(
+        self,
+        cursor: str | None = None,
+        limit: int = Query(20, gt=0, lt=101),
+        fields: List[str] | None = Query(None),
+    ):
+        fields = parse_fields(ProjectList, fields)
+        # stored fan-out rows merged with the projects of followed accounts
+        # that are too large to fan out, both newest first
+        fanned_out = select(FeedItem.created_at, FeedItem.project_id).where(
+            FeedItem.user_id == self.auth.user.id
+        )
+        large_owners = (
+            select(User.id)
+            .join(Follower, Follower.following_id == User.id)
+            .where(
+                Follower.follower_id == self.auth.user.id,
+                User.followers_count > settings.FEED_FANOUT_MAX_FOLLOWERS,
+            )
+        )
+        pulled = select(Project.created_at, Project.id).where(
+            Project.owner_id.in_(large_owners)
+        )
+        if cursor:
+            last_created_at, last_id = decode_cursor(cursor, datetime, int)
+            fanned_out = fanned_out.where(
+                tuple_(FeedItem.created_at, FeedItem.project_id)
+                < tuple_(last_created_at, last_id)
+            )
+            pulled = pulled.where(
+                tuple_(Project.created_at, Project.id)
+                < tuple_(last_created_at, last_id)
+            )
+        keys = set()
+        for query, created_at, project_id in (
+            (fanned_out, FeedItem.created_at, FeedItem.project_id),
+            (pulled, Project.created_at, Project.id),
+        ):
+            rows = self.auth.session.exec(
+                query.order_by(created_at.desc(), project_id.desc()).limit(limit + 1)
+            )
+            keys.update(tuple(row) for row in rows)
+        keys = sorted(keys, reverse=True)
+        page = keys[:limit]
+        projects = {}
+        if page:
+            result = self.auth.session.exec(
+                select(Project, Status).where(
+                    Project.status_id == Status.id,
+                    Project.id.in_([project_id for _, project_id in page]),
                 )
-            ).first()
-            if follow:
-                self.auth.session.delete(follow)
-                self.auth.session.commit()
-                return JSONResponse(status_code=200, content={})
-            else:
-                raise not_found_exception
-        except IntegrityError:
-            raise permission_exception
+            )
+            projects = {
+                project["id"]: project
+                for project in collect_project_list(self.auth.session, result, fields)
+            }
+        next_cursor = None
+        if len(keys) > limit:
+            next_cursor = encode_cursor(*page[-1])
+        return FastJSONResponse(
+            {
+                "projects": [
+                    projects[project_id]
+                    for _, project_id in page
+                    if project_id in projects
+                ],
+                "next": next_cursor,
+            }
+        )
 
     @authenticated_router.get(
         "/followings",
-        response_model=List[UserShortOut],
+        response_model=UserShortPage,
     )
-    def list_followings(self):
-        result = self.auth.session.exec(
-            select(Follower, User).where(
-                Follower.following_id == User.id, Follower.follower == self.auth.user
+    def list_followings(
+        self,
+        user_id: int | None = None,
+        cursor: str | None = None,
+        limit: int = Query(50, gt=0, lt=201),
+    ):
+        return FastJSONResponse(
+            self.follow_page(
+                Follower.follower_id, Follower.following_id, user_id, cursor, limit
             )
-        ).unique()
-        followings = []
-        for _, user in result:
-            followings.append(user)
-
-        return followings
+        )
 
     @authenticated_router.get(
         "/followers",
-        response_model=List[UserShortOut],
+        response_model=UserShortPage,
     )
-    def list_followers(self):
-        result = self.auth.session.exec(
-            select(Follower, User).where(
-                Follower.follower_id == User.id, Follower.following == self.auth.user
+    def list_followers(
+        self,
+        user_id: int | None = None,
+        cursor: str | None = None,
+        limit: int = Query(50, gt=0, lt=201),
+    ):
+        return FastJSONResponse(
+            self.follow_page(
+                Follower.following_id, Follower.follower_id, user_id, cursor, limit
             )
-        ).unique()
-        followings = []
-        for _, user in result:
-            followings.append(user)
-
-        return followings
+        )
 
     @authenticated_router.put(
         "/user", response_model=UserOut, response_model_exclude_none=True
@@ -905,6 +1609,11 @@ class AuthenticatedRouter:
             self.auth.session.refresh(self.auth.user)
         except IntegrityError:
             raise invalid_data_exception
+        freelancer_skill_index.set_user(
+            self.auth.user.id, [technology.id for technology in technologies_list]
+        )
+        refresh_freelancer_rank(self.auth.session, self.auth.user.id)
+        self.auth.session.commit()
 
         user_out = UserOut.from_orm(self.auth.user)
         user_out.experiences = experiences_list
@@ -936,13 +1645,17 @@ class AuthenticatedRouter:
             raise permission_exception
 
     @authenticated_router.get("/technology", response_model=List[TechnologyOut])
-    def find_technology(self, title: str):
-        technologies = self.auth.session.exec(
-            select(Technology).where(
-                Technology.title.like("%" + title + "%"),
-            )
-        ).all()
-        return technologies
+    def find_technology(
+        self, request: ApiRequest, title: str, limit: int = Query(10, lt=51)
+    ):
+        technology_index.ensure_loaded(self.auth.session)
+        etag = make_etag(title, limit, *technology_index.version)
+        return conditional_response(
+            request,
+            "/technology",
+            etag,
+            lambda: technology_index.search(title, limit),
+        )
 
     @authenticated_router.post("/project/done")
     def make_project_done(self, project_id: int):
@@ -957,8 +1670,18 @@ class AuthenticatedRouter:
                     select(Status).where(Status.title == ProjectStatusEnum.done)
                 ).first()
                 project.status = done_status
+                project.finished_at = datetime.utcnow()
                 self.auth.session.add(project)
+                record_project_change(self.auth.session, project.id)
+                refresh_freelancer_rank(self.auth.session, project.doer_id)
                 self.auth.session.commit()
+                project_list_cache.invalidate()
+                project_facets.move(
+                    project.price_to,
+                    [pt.technology_id for pt in project.project_technologies],
+                    ProjectStatusEnum.assigned,
+                    ProjectStatusEnum.done,
+                )
                 return JSONResponse(status_code=200, content={})
             except IntegrityError:
                 raise permission_exception
@@ -976,7 +1699,7 @@ class AuthenticatedRouter:
             and project.status.title == ProjectStatusEnum.unassigned
             and doer_id != self.auth.user.id
         ):
-            if doer_id not in map(lambda p: p.offerer_id, project.offers):
+            if self.auth.session.get(Offer, (doer_id, project_id)) is None:
                 raise permission_exception
             try:
                 assigned_status = self.auth.session.exec(
@@ -987,7 +1710,16 @@ class AuthenticatedRouter:
                 project.started_at = datetime.utcnow()
                 project.deadline_until = datetime.utcnow() + timedelta(duration_day)
                 self.auth.session.add(project)
+                record_project_change(self.auth.session, project.id)
                 self.auth.session.commit()
+                project_list_cache.invalidate()
+                project_skill_index.remove(project.id)
+                project_facets.move(
+                    project.price_to,
+                    [pt.technology_id for pt in project.project_technologies],
+                    ProjectStatusEnum.unassigned,
+                    ProjectStatusEnum.assigned,
+                )
                 self.auth.session.refresh(project)
                 return PickDoer(doer=project.doer)
             except IntegrityError:
@@ -1012,6 +1744,7 @@ class AuthenticatedRouter:
                 new_comment = Comment.from_orm(comment_in)
                 new_comment.from_user = self.auth.user
                 self.auth.session.add(new_comment)
+                refresh_freelancer_rank(self.auth.session, to_user.id)
                 self.auth.session.commit()
                 return JSONResponse(status_code=201, content={})
             except IntegrityError:
@@ -1064,44 +1797,133 @@ class AuthenticatedRouter:
         result = self.auth.session.exec(query).all()
         return result
 
-    @authenticated_router.get("/chat", response_model=List[Message])
-    def get_user_message(self, user_id: int, page: int = 1, limit: int = 10):
+    @authenticated_router.get("/chat", response_model=MessagePage)
+    def get_user_message(
+        self,
+        user_id: int,
+        cursor: str | None = None,
+        limit: int = Query(10, gt=0, lt=101),
+    ):
         self.auth.session.exec(
             update(Message)
-            .where(Message.from_user_id == user_id, Message.to_user == self.auth.user)
+            .where(
+                Message.from_user_id == user_id,
+                Message.to_user_id == self.auth.user.id,
+                Message.is_read.is_(False),
+            )
             .values(is_read=True),
         )
         self.auth.session.commit()
-        result = self.auth.session.exec(
-            select(Message)
-            .where(
-                or_(
-                    and_(
-                        Message.from_user == self.auth.user,
-                        Message.to_user_id == user_id,
-                    ),
-                    and_(
-                        Message.to_user == self.auth.user,
-                        Message.from_user_id == user_id,
-                    ),
+        query = select(Message).where(
+            or_(
+                and_(
+                    Message.from_user_id == self.auth.user.id,
+                    Message.to_user_id == user_id,
+                ),
+                and_(
+                    Message.to_user_id == self.auth.user.id,
+                    Message.from_user_id == user_id,
+                ),
+            )
+        )
+        before = None
+        if cursor:
+            # keyset on (created_at, id), newest first
+            before = tuple(decode_cursor(cursor, datetime, int))
+            query = query.where(
+                tuple_(Message.created_at, Message.id) < tuple_(*before)
+            )
+        messages = [
+            MessageOut.from_orm(message)
+            for message in self.auth.session.exec(
+                query.order_by(Message.created_at.desc(), Message.id.desc()).limit(
+                    limit + 1
                 )
             )
-            .order_by(Message.created_at.desc())
-            .offset((page - 1) * limit)
-            .limit(limit)
-        ).all()
-        result.reverse()
-        return result
+        ]
+        if len(messages) <= limit:
+            # the rest of the conversation may be in archived partitions
+            if messages:
+                before = (messages[-1].created_at, messages[-1].id)
+            messages += read_archived_messages(
+                self.auth.session,
+                self.auth.user.id,
+                user_id,
+                before,
+                limit + 1 - len(messages),
+            )
+        next_cursor = None
+        if len(messages) > limit:
+            last = messages[limit - 1]
+            next_cursor = encode_cursor(last.created_at, last.id)
+        messages = messages[:limit]
+        messages.reverse()
+        return FastJSONResponse(MessagePage(messages=messages, next=next_cursor))
+
+    @authenticated_router.get("/chat/search", response_model=MessageSearchPage)
+    def search_user_messages(
+        self,
+        q: str = Query(..., min_length=1, max_length=200),
+        user_id: int | None = None,
+        cursor: str | None = None,
+        limit: int = Query(20, gt=0, lt=101),
+    ):
+        # indexed by a scheduled job, the newest messages show up within
+        # SEARCH_INDEX_INTERVAL_SECONDS
+        after = tuple(decode_cursor(cursor, float, int)) if cursor else None
+        hits = search_messages(
+            self.auth.session, self.auth.user.id, q, user_id, after, limit + 1
+        )
+        next_cursor = None
+        if len(hits) > limit:
+            next_cursor = encode_cursor(hits[limit - 1].rank, hits[limit - 1].id)
+        return FastJSONResponse(
+            MessageSearchPage(hits=hits[:limit], next=next_cursor)
+        )
+
+    @authenticated_router.get("/chat/presence", response_model=Presence)
+    def get_presence(
+        self, user_ids: List[int] = Query(..., max_items=settings.BATCH_MAX_IDS)
+    ):
+        return Presence(online=connection_manager.online(user_ids))
 
     @authenticated_router.websocket("/chat/ws")
-    async def chat_manger(self, websocket: WebSocket):
+    async def chat_manger(self, websocket: WebSocket, last_seen_id: int | None = None):
+        connection = await connection_manager.connect(self.auth.user.id, websocket)
         try:
-            await connection_manager.connect(self.auth.user.id, websocket)
+            if last_seen_id is not None:
+                await connection_manager.catch_up(
+                    connection, self.auth.session, last_seen_id
+                )
             while True:
                 message_block = await websocket.receive_json()
-                await connection_manager.send_personal_message(self.auth, message_block)
+                # any frame, pongs included, proves the socket is alive
+                connection_manager.touch(connection)
+                match message_block.get("type"):
+                    case "pong":
+                        continue
+                    case "ping":
+                        connection_manager.enqueue(connection, '{"type":"pong"}')
+                    case "sync":
+                        last_seen = message_block.get("last_seen_id")
+                        if type(last_seen) is not int:
+                            # never silently from the start of the history
+                            connection_manager.enqueue(
+                                connection,
+                                '{"type":"error","detail":"last_seen_id required"}',
+                            )
+                            continue
+                        await connection_manager.catch_up(
+                            connection, self.auth.session, last_seen
+                        )
+                    case _:
+                        await connection_manager.send_personal_message(
+                            self.auth, message_block
+                        )
         except WebSocketDisconnect:
-            connection_manager.disconnect(self.auth.user)
+            pass
+        finally:
+            connection_manager.disconnect(connection)
 
     @authenticated_router.post("/user/picture")
     async def upload_profile_picture(self, file: UploadFile = File(...)):
@@ -1145,6 +1967,7 @@ class CriticallyAuthenticatedRouter:
             technology.slug = slugify(technology.title)
             self.auth.session.add(technology)
             self.auth.session.commit()
+            technology_index.load(self.auth.session)
             return technology
         except IntegrityError:
             raise conflict_exception
@@ -1157,6 +1980,7 @@ class CriticallyAuthenticatedRouter:
             technology.slug = slugify(title)
             self.auth.session.add(technology)
             self.auth.session.commit()
+            technology_index.load(self.auth.session)
             return technology
         else:
             raise not_found_exception
@@ -1167,6 +1991,7 @@ class CriticallyAuthenticatedRouter:
         if technology:
             self.auth.session.delete(technology)
             self.auth.session.commit()
+            technology_index.load(self.auth.session)
             return technology
         else:
             raise not_found_exception
@@ -1249,6 +2074,31 @@ class CriticallyAuthenticatedRouter:
         )
         return users
 
+    @admin_router.get("/users/export")
+    def export_users(
+        self,
+        export_format: ExportFormatEnum = Query(
+            ExportFormatEnum.ndjson, alias="format"
+        ),
+    ):
+        return export_response(
+            select(
+                User.id,
+                User.email,
+                User.name,
+                Role.title.label("role"),
+                User.id_number,
+                User.is_verified,
+                User.is_email_verified,
+                User.is_superuser,
+                User.created_at,
+            )
+            .outerjoin(Role, User.role_id == Role.id)
+            .order_by(User.id),
+            export_format,
+            "users",
+        )
+
     @admin_router.delete("/users", response_model=UserOut)
     def delete_user(self, user_id: int):
         user = self.auth.session.get(User, user_id)
@@ -1258,6 +2108,7 @@ class CriticallyAuthenticatedRouter:
                     raise permission_exception
             self.auth.session.delete(user)
             self.auth.session.commit()
+            freelancer_skill_index.remove(user_id)
             return user
         else:
             raise not_found_exception
@@ -1266,8 +2117,22 @@ class CriticallyAuthenticatedRouter:
     def delete_project(self, project_id: int):
         project = self.auth.session.get(Project, project_id)
         if project:
+            facet_key = (
+                project.status.title,
+                project.price_to,
+                [pt.technology_id for pt in project.project_technologies],
+            )
+            self.auth.session.exec(
+                delete(FeedItem).where(FeedItem.project_id == project_id)
+            )
             self.auth.session.delete(project)
+            record_project_change(
+                self.auth.session, project_id, ChangeKindEnum.delete
+            )
             self.auth.session.commit()
+            project_list_cache.invalidate()
+            project_skill_index.remove(project_id)
+            project_facets.add(*facet_key, delta=-1)
             self.auth.session.refresh(project)
             return project
         else:
@@ -1289,6 +2154,29 @@ class CriticallyAuthenticatedRouter:
         ).all()
         return requests
 
+    @admin_router.get("/requests/export")
+    def export_user_requests(
+        self,
+        export_format: ExportFormatEnum = Query(
+            ExportFormatEnum.ndjson, alias="format"
+        ),
+    ):
+        return export_response(
+            select(
+                Request.id,
+                Request.user_id,
+                User.email,
+                Request.request_type,
+                Request.accepted,
+                Request.responded_at,
+                Request.created_at,
+            )
+            .join(User, Request.user_id == User.id)
+            .order_by(Request.id),
+            export_format,
+            "requests",
+        )
+
     @admin_router.get("/respond")
     def respond_to_request(self, request_id: int, accept: bool):
         request = self.auth.session.get(Request, request_id)
@@ -1331,6 +2219,61 @@ class CriticallyAuthenticatedRouter:
         else:
             raise not_found_exception
 
+    @admin_router.post("/bulk/requests/respond", response_model=BulkResult)
+    def bulk_respond_to_requests(self, respond_in: BulkRespondIn):
+        return FastJSONResponse(
+            bulk_result(
+                respond_to_requests(self.auth.session, respond_in, respond_in.accept)
+            )
+        )
+
+    @admin_router.post("/bulk/users/validate", response_model=BulkResult)
+    def bulk_validate_users(self, selection: BulkUserSelection):
+        return FastJSONResponse(
+            bulk_result(set_users_verified(self.auth.session, selection, True))
+        )
+
+    @admin_router.post("/bulk/users/invalidate", response_model=BulkResult)
+    def bulk_invalidate_users(self, selection: BulkUserSelection):
+        return FastJSONResponse(
+            bulk_result(set_users_verified(self.auth.session, selection, False))
+        )
+
+    @admin_router.post("/bulk/users/delete", response_model=BulkResult)
+    def bulk_delete_users(self, selection: BulkUserSelection):
+        outcomes = delete_users(self.auth.session, selection, self.auth.user)
+        for user_id, outcome in outcomes.items():
+            if outcome == BulkOutcomeEnum.ok:
+                freelancer_skill_index.remove(user_id)
+        return FastJSONResponse(bulk_result(outcomes))
+
+    @admin_router.get("/stats", response_model=List[DailyStatOut])
+    def get_stats(
+        self,
+        metric: StatMetricEnum,
+        since: date | None = None,
+        until: date | None = None,
+    ):
+        # reads the rollups only, they trail the tables by STATS_INTERVAL_SECONDS
+        until = until or datetime.utcnow().date()
+        since = since or until - timedelta(days=30)
+        if since > until:
+            raise invalid_data_exception
+        return FastJSONResponse(
+            [
+                DailyStatOut.from_orm(stat)
+                for stat in daily_stats(self.auth.session, metric, since, until)
+            ]
+        )
+
+    @admin_router.get("/maintenance", response_model=dict[str, JobMetrics])
+    def get_maintenance_metrics(self):
+        return scheduler.metrics
+
+    @admin_router.get("/jobs")
+    def get_job_queue_stats(self):
+        return queue_stats(self.auth.session)
+
     @admin_router.get("/role", response_model=List[Role])
     def list_all_roles(self):
         return self.auth.session.exec(select(Role)).all()
@@ -0,0 +1,140 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import Float, cast, delete, union_all
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.sql.expression import tuple_
+from sqlmodel import Session, and_, func, select
+
+from ..settings import settings
+from .models import Message, MessageSearch, MessageSearchHit, StatWatermark
+
+WATERMARK = "message_search"
+HEADLINE_OPTIONS = "MaxFragments=2, MinWords=5, MaxWords=20"
+
+
+def index_messages(session: Session) -> int:
+    # walks message in (created_at, id) order from the last run, a little
+    # before it to catch late commits; rows already indexed are skipped
+    watermark = session.get(StatWatermark, WATERMARK)
+    if watermark is None:
+        watermark = StatWatermark(name=WATERMARK, last_at=datetime(1970, 1, 1))
+    after = (
+        watermark.last_at - timedelta(seconds=settings.STATS_LATE_SECONDS),
+        0,
+    )
+    key = tuple_(Message.created_at, Message.id)
+    total = 0
+    while True:
+        keys = session.exec(
+            select(Message.created_at, Message.id)
+            .where(key > tuple_(*after))
+            .order_by(Message.created_at, Message.id)
+            .limit(settings.SEARCH_INDEX_BATCH_SIZE)
+        ).all()
+        if not keys:
+            break
+        in_batch = and_(key > tuple_(*after), key <= tuple_(*keys[-1]))
+        document = func.to_tsvector(settings.SEARCH_CONFIG, Message.text)
+        session.exec(
+            insert(MessageSearch)
+            .from_select(
+                ["user_id", "other_user_id", "message_id", "created_at", "document"],
+                union_all(
+                    select(
+                        Message.from_user_id,
+                        Message.to_user_id,
+                        Message.id,
+                        Message.created_at,
+                        document,
+                    ).where(in_batch),
+                    select(
+                        Message.to_user_id,
+                        Message.from_user_id,
+                        Message.id,
+                        Message.created_at,
+                        document,
+                    ).where(in_batch),
+                ),
+            )
+            .on_conflict_do_nothing()
+        )
+        after = tuple(keys[-1])
+        watermark.last_at = max(watermark.last_at, after[0])
+        session.add(watermark)
+        session.commit()
+        total += len(keys)
+        if len(keys) < settings.SEARCH_INDEX_BATCH_SIZE:
+            break
+    return total
+
+
+def drop_search_rows(session: Session, start: datetime, end: datetime):
+    # archived messages leave the search, the caller commits
+    session.exec(
+        delete(MessageSearch)
+        .where(MessageSearch.created_at >= start, MessageSearch.created_at < end)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def search_messages(
+    session: Session,
+    user_id: int,
+    text: str,
+    other_user_id: int | None,
+    after: tuple[float, int] | None,
+    limit: int,
+) -> list[MessageSearchHit]:
+    query = func.websearch_to_tsquery(settings.SEARCH_CONFIG, text)
+    # ts_rank is a real, as a double it round trips through the cursor and
+    # the keyset compares it to itself
+    rank = cast(func.ts_rank(MessageSearch.document, query), Float(53))
+    hits = select(
+        MessageSearch.message_id,
+        MessageSearch.created_at,
+        MessageSearch.other_user_id,
+        rank.label("rank"),
+    ).where(MessageSearch.user_id == user_id, MessageSearch.document.op("@@")(query))
+    if other_user_id:
+        hits = hits.where(MessageSearch.other_user_id == other_user_id)
+    if after:
+        # keyset on (rank, message id), best first
+        hits = hits.where(tuple_(rank, MessageSearch.message_id) < tuple_(*after))
+    hits = (
+        hits.order_by(rank.desc(), MessageSearch.message_id.desc())
+        .limit(limit)
+        .subquery()
+    )
+    # headlines only for the page, they read the message text
+    rows = session.exec(
+        select(
+            hits.c.message_id,
+            hits.c.created_at,
+            Message.from_user_id,
+            hits.c.other_user_id,
+            hits.c.rank,
+            func.ts_headline(
+                settings.SEARCH_CONFIG, Message.text, query, HEADLINE_OPTIONS
+            ),
+        )
+        .select_from(hits)
+        .join(
+            Message,
+            and_(
+                Message.id == hits.c.message_id,
+                Message.created_at == hits.c.created_at,
+            ),
+        )
+        .order_by(hits.c.rank.desc(), hits.c.message_id.desc())
+    ).all()
+    return [
+        MessageSearchHit(
+            id=message_id,
+            created_at=created_at,
+            from_user_id=from_user_id,
+            other_user_id=other_user_id,
+            rank=rank,
+            headline=headline,
+        )
+        for message_id, created_at, from_user_id, other_user_id, rank, headline in rows
+    ]
@@ -24,12 +24,26 @@ class ProjectStatusEnum(str, Enum):
     done = "done"
     unassigned = "unassigned"
     assigned = "assigned"
+    expired = "expired"
 
 
 class SortEnum(str, Enum):
     date = "created_at"
     price = "price_to"
 
+class OfferSortEnum(str, Enum):
+    price = "offer_price"
+    duration = "duration_day"
+    rating = "rating"
+
+class OverflowPolicyEnum(str, Enum):
+    drop = "drop"
+    disconnect = "disconnect"
+
+class ExportFormatEnum(str, Enum):
+    ndjson = "ndjson"
+    csv = "csv"
+
 class SortRequestEnum(str, Enum):
     date = 'created_at'
     response = 'responded_at'
@@ -42,4 +56,30 @@ class SortDirEnum(str, Enum):
     descending = "desc"
 
 class RequestType(str, Enum):
-    verification = 'verification'
\ No newline at end of file
+    verification = 'verification'
+
+class JobStatusEnum(str, Enum):
+    queued = "queued"
+    running = "running"
+    done = "done"
+    failed = "failed"
+
+
+class ChangeKindEnum(str, Enum):
+    upsert = "upsert"
+    delete = "delete"
+
+
+class BulkOutcomeEnum(str, Enum):
+    ok = "ok"
+    not_found = "not_found"
+    forbidden = "forbidden"
+    conflict = "conflict"
+
+
+class StatMetricEnum(str, Enum):
+    signups = "signups"
+    projects = "projects"
+    offers = "offers"
+    messages = "messages"
+    projects_by_status = "projects_by_status"
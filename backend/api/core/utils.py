@@ -1,20 +1,25 @@
+import base64
+import json
 import smtplib
 from datetime import datetime, timedelta
 from hashlib import md5
 from secrets import compare_digest
-from typing import Union
+from typing import List, Union
 
 from fastapi import Cookie, Depends
-from fastapi.websockets import WebSocket
 from jose import JWTError, jwt
-from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.orm import lazyload
 from sqlmodel import Session, select
 
 from ..db import get_engine
 from ..settings import settings
-from .models import Message, Plan, User
-from .responses import credentials_exception, not_found_exception
-from .types import GeneralRole, PlanEnum
+from .models import User
+from .responses import (
+    credentials_exception,
+    invalid_data_exception,
+    not_found_exception,
+)
+from .types import GeneralRole
 
 
 class Auth:
@@ -47,7 +52,8 @@ def get_user(
     fail_silently: bool = False,
 ) -> User:
     if user_id:
-        user = session.get(User, user_id)
+        # comments are joined by default, most requests never read them
+        user = session.get(User, user_id, options=[lazyload(User.comments)])
     elif email:
         user = session.exec(select(User).where(User.email == email)).first()
     if user is None:
@@ -69,14 +75,8 @@ def authenticate_user(
             raise credentials_exception
     except JWTError:
         raise credentials_exception
+    # expired plans are downgraded by the maintenance scheduler
     user = get_user(session, int(user_id))
-    if user.plan_expire_at and user.plan_expire_at < datetime.utcnow():
-        free_plan = session.exec(
-            select(Plan).where(Plan.title == PlanEnum.free)
-        ).first()
-        user.plan = free_plan
-        session.add(user)
-        session.commit()
     return Auth(user, session)
 
 
@@ -101,42 +101,83 @@ def update_model(origin_obj, update_obj):
         setattr(origin_obj, key, value)
 
 
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: dict[int, WebSocket] = {}
-
-    async def connect(self, user_id: int, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections[user_id] = websocket
-
-    def disconnect(self, user_id: int):
-        del self.active_connections[user_id]
-
-    async def send_personal_message(self, auth: Auth, message_block: dict):
-        text = message_block.get("text")
-        to_user_id = message_block.get("to_user_id")
-        if to_user_id and text:
-            to_user_id = int(to_user_id)
-            receiver_socket = self.active_connections.get(to_user_id)
-            if receiver_socket:
-                await receiver_socket.send_json(
-                    {
-                        "text": text,
-                        "to_user_id": to_user_id,
-                        "from_user_id": auth.user.id,
-                    }
-                )
-            try:
-                message_db = Message(
-                    text=text, to_user_id=to_user_id, from_user=auth.user
-                )
-                auth.session.add(message_db)
-                auth.session.commit()
-            except (IntegrityError, DataError, ValueError):
-                pass
-
-
-def sendmail(recipient: str, body: str, subject: str = "Freelancer"):
+class FieldSelection:
+    # Exposes only the selected attributes of an orm object, so building an
+    # output model with from_orm never touches (and lazy loads) the others.
+    def __init__(self, obj, fields: set[str] | None, **extra) -> None:
+        self._obj = obj
+        self._fields = fields
+        self._extra = extra
+
+    def __getattr__(self, name):
+        if self._fields is not None and name not in self._fields:
+            raise AttributeError(name)
+        if name in self._extra:
+            return self._extra[name]
+        return getattr(self._obj, name)
+
+
+def parse_fields(model, fields: List[str] | None) -> set[str] | None:
+    # accepts both ?fields=a&fields=b and ?fields=a,b
+    if not fields:
+        return None
+    selected = {
+        field.strip() for value in fields for field in value.split(",") if field.strip()
+    }
+    if not selected.issubset(model.__fields__):
+        raise invalid_data_exception
+    return selected | {"id"}
+
+
+def wants(fields: set[str] | None, name: str) -> bool:
+    return fields is None or name in fields
+
+
+def from_orm_fields(model, obj, fields: set[str] | None, **extra) -> dict:
+    readable = fields
+    if fields is not None:
+        readable = fields | {
+            name for name, field in model.__fields__.items() if field.required
+        }
+    out = model.from_orm(FieldSelection(obj, readable, **extra))
+    return out.dict(include=fields, exclude_none=True)
+
+
+def encode_cursor(*values) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values, default=str).encode()).decode()
+
+
+def decode_cursor_value(value, type_: type):
+    # json has no datetime, and a bool passes for an int but never belongs
+    if isinstance(value, bool):
+        raise ValueError(value)
+    if type_ is datetime and isinstance(value, str):
+        return datetime.fromisoformat(value)
+    if type_ is float and isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, type_):
+        return value
+    raise ValueError(value)
+
+
+def decode_cursor(cursor: str, *types: type) -> list:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise invalid_data_exception
+    if not isinstance(values, list) or len(values) != len(types):
+        raise invalid_data_exception
+    try:
+        return [
+            decode_cursor_value(value, type_) for value, type_ in zip(values, types)
+        ]
+    except ValueError:
+        raise invalid_data_exception
+
+
+def sendmail(
+    recipient: str, body: str, subject: str = "Freelancer", raise_errors: bool = False
+):
     with open("mails", "a") as f:
         f.write(f"{recipient}: {body}\n")
     message = f"Subject: {subject}\n\n{body}"
@@ -148,5 +189,8 @@ def sendmail(recipient: str, body: str, subject: str = "Freelancer"):
             server.login(settings.MAIL_USERNAME, settings.MAIL_PASSWORD)
             # server.sendmail(settings.MAIL_USERNAME, recipient, message)
 
-    except:
+    except Exception:
+        # the job queue retries with backoff, so it needs to see the error
+        if raise_errors:
+            raise
         return
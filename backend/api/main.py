@@ -1,3 +1,4 @@
+import asyncio
 import hashlib
 
 from fastapi import FastAPI
@@ -8,8 +9,16 @@ from fastapi.staticfiles import StaticFiles
 from fastapi_utils.inferring_router import InferringRouter
 from sqlmodel import Session, SQLModel
 
+from .core.indexes import technology_index
+from .core.maintenance import scheduler
 from .core.models import Plan, Role, Status, User
-from .core.router import admin_router, authenticated_router, router
+from .core.router import (
+    admin_router,
+    authenticated_router,
+    connection_manager,
+    project_notifier,
+    router,
+)
 from .db import get_engine
 from .settings import settings
 
@@ -44,7 +53,9 @@ def startup():
         unassigned = Status(title="unassigned")
         assigned = Status(title="assigned")
         done = Status(title="done")
+        expired = Status(title="expired")
         session.add(unassigned)
+        session.add(expired)
         session.add(done)
         session.add(assigned)
         session.add(user)
@@ -75,6 +86,22 @@ def get_application():
         return _app.openapi_schema
 
     _app.openapi = custom_openapi
+
+    @_app.on_event("startup")
+    async def start_background_tasks():
+        # keep references so the tasks are not garbage collected
+        _app.state.background_tasks = [
+            asyncio.create_task(project_notifier.run()),
+            asyncio.create_task(connection_manager.run()),
+        ]
+        if settings.RUN_SCHEDULER:
+            scheduler.start()
+        with Session(get_engine()) as session:
+            technology_index.load(session)
+
+    @_app.on_event("shutdown")
+    def stop_background_tasks():
+        scheduler.stop()
     apiRouter = InferringRouter(prefix=settings.URL_PREFIX)
 
     @apiRouter.get("/docs", include_in_schema=False)
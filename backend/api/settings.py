@@ -20,6 +20,66 @@ class Settings(BaseSettings):
     MAIL_PORT: str = int(os.environ["MAIL_PORT"])
     BASE_DIR: PosixPath = _base_dir
     DATA_PATH: str = "data"
+    # Cache-Control header per route, set CACHE_CONTROL as json to override
+    CACHE_CONTROL: dict[str, str] = {
+        "/role": "public, max-age=3600",
+        "/plan": "public, max-age=3600",
+        "/technology": "private, max-age=300",
+        "/project/detail": "private, no-cache",
+    }
+    PROJECT_LIST_CACHE_TTL: float = 5
+    PROJECT_LIST_CACHE_SIZE: int = 1024
+    INDEX_RELOAD_SECONDS: float = 300
+    INDEX_REFRESH_SECONDS: float = 5
+    INDEX_REFRESH_OVERLAP_SECONDS: float = 60
+    NOTIFY_INTERVAL_SECONDS: float = 1
+    NOTIFY_BATCH_SIZE: int = 200
+    NOTIFY_MAX_PROJECTS: int = 20
+    # chat sockets, a full send queue drops its oldest frame or the socket
+    WS_QUEUE_SIZE: int = 100
+    WS_OVERFLOW_POLICY: str = "drop"
+    WS_MAX_PER_USER: int = 5
+    WS_HEARTBEAT_INTERVAL_SECONDS: float = 20
+    WS_HEARTBEAT_TIMEOUT_SECONDS: float = 60
+    WS_SEND_TIMEOUT_SECONDS: float = 10
+    CHAT_CATCHUP_LIMIT: int = 500
+    CHAT_CATCHUP_OVERLAP_SECONDS: float = 10
+    RUN_SCHEDULER: bool = True
+    PLAN_SWEEP_INTERVAL_SECONDS: float = 60
+    PURGE_INTERVAL_SECONDS: float = 600
+    MAINTENANCE_BATCH_SIZE: int = 1000
+    JOB_CONCURRENCY: int = 4
+    JOB_MAX_ATTEMPTS: int = 5
+    JOB_RETRY_BACKOFF_SECONDS: float = 10
+    JOB_TIMEOUT_SECONDS: float = 300
+    JOB_RETENTION_DAYS: int = 7
+    BATCH_MAX_IDS: int = 100
+    RANK_RECENCY_DAYS: float = 90
+    PROJECT_CHANGE_RETENTION_DAYS: int = 7
+    # owners with more followers are merged into /feed at read time
+    FEED_FANOUT_MAX_FOLLOWERS: int = 5000
+    EXPORT_BATCH_SIZE: int = 2000
+    BULK_MAX_IDS: int = 10000
+    BULK_BATCH_SIZE: int = 500
+    STATS_INTERVAL_SECONDS: float = 15 * 60
+    # rows committed this late after their created_at are still counted
+    STATS_LATE_SECONDS: float = 5 * 60
+    # message partitions are monthly, created ahead and archived when cold
+    MESSAGE_PARTITIONS_AHEAD: int = 2
+    MESSAGE_HOT_MONTHS: int = 12
+    MESSAGE_ARCHIVE_PATH: str = "messages"
+    MESSAGE_ARCHIVE_INTERVAL_SECONDS: float = 24 * 60 * 60
+    SEARCH_CONFIG: str = "simple"
+    SEARCH_INDEX_INTERVAL_SECONDS: float = 30
+    SEARCH_INDEX_BATCH_SIZE: int = 1000
+    PRICE_BUCKETS: list[int] = [
+        500000,
+        1000000,
+        2000000,
+        5000000,
+        10000000,
+        20000000,
+    ]
 
 
 @lru_cache()
@@ -0,0 +1,308 @@
+"""Chat throughput of one worker.
+
+Serves the app with uvicorn in a background thread against the configured
+local database, connects N websocket clients to /chat/ws and has them send
+messages to each other at a fixed total rate. The clients run in their own
+processes, so they do not compete with the server for its GIL. Reports
+delivery latency (send to receive of the live frame), the server event loop
+lag and the message rows written per second of sending. The scheduler is
+not started so its jobs do not skew the numbers; benchmark users are kept
+for the next run, their messages are deleted afterwards.
+
+run from the backend folder:
+    python -m benchmarks.chat --clients 200 --rate 500 --duration 30
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import random
+import statistics
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List
+
+import uvicorn
+import websockets
+from sqlalchemy import delete
+from sqlmodel import Session, func, or_, select
+
+from api.core.models import Message, MessageSearch, User
+from api.core.utils import create_access_token
+from api.db import get_engine
+from api.settings import settings
+
+EMAIL = "chat-bench-{}@example.com"
+
+
+def ensure_users(count: int) -> List[int]:
+    emails = [EMAIL.format(i) for i in range(count)]
+    with Session(get_engine()) as session:
+        existing = set(
+            session.exec(select(User.email).where(User.email.in_(emails))).all()
+        )
+        for email in emails:
+            if email not in existing:
+                session.add(
+                    User(
+                        email=email,
+                        hashed_password=hashlib.md5(b"bench").hexdigest(),
+                        is_email_verified=True,
+                    )
+                )
+        session.commit()
+        users = dict(
+            session.exec(select(User.email, User.id).where(User.email.in_(emails)))
+        )
+    return [users[email] for email in emails]
+
+
+def count_messages(user_ids: List[int], since: datetime) -> int:
+    with Session(get_engine()) as session:
+        return session.exec(
+            select(func.count()).where(
+                Message.from_user_id.in_(user_ids), Message.created_at >= since
+            )
+        ).one()
+
+
+def delete_messages(user_ids: List[int]) -> None:
+    with Session(get_engine()) as session:
+        session.exec(delete(MessageSearch).where(MessageSearch.user_id.in_(user_ids)))
+        session.exec(
+            delete(Message).where(
+                or_(
+                    Message.from_user_id.in_(user_ids), Message.to_user_id.in_(user_ids)
+                )
+            )
+        )
+        session.commit()
+
+
+class ServerThread:
+    # uvicorn in a daemon thread, its loop is kept to probe it for lag
+    def __init__(self, port: int) -> None:
+        settings.RUN_SCHEDULER = False
+        from api.main import app
+
+        self.loop: asyncio.AbstractEventLoop | None = None
+
+        async def capture_loop():
+            self.loop = asyncio.get_running_loop()
+
+        app.router.on_startup.append(capture_loop)
+        self.server = uvicorn.Server(
+            uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+        )
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def start(self) -> None:
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.05)
+
+    def stop(self) -> None:
+        self.server.should_exit = True
+        self.thread.join()
+
+
+async def probe_lag(interval: float, lags: List[float], stop: threading.Event):
+    # runs on the server loop, how late a sleep wakes up is the loop lag
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+
+
+class Client:
+    def __init__(self, user_id: int, token: str, url: str) -> None:
+        self.user_id = user_id
+        self.url = url
+        self.token = token
+        self.websocket = None
+        self.received = 0
+
+    async def connect(self) -> None:
+        self.websocket = await websockets.connect(
+            self.url, extra_headers={"Cookie": f"access_token={self.token}"}
+        )
+
+    async def receive(self, latencies: List[float]) -> None:
+        async for raw in self.websocket:
+            frame = json.loads(raw)
+            if frame.get("type") == "ping":
+                await self.websocket.send('{"type":"pong"}')
+            elif "from_user_id" in frame and "type" not in frame:
+                # the text is the sender's perf_counter, a monotonic clock
+                # shared by the client processes on this host
+                latencies.append(time.perf_counter() - float(frame["text"]))
+                self.received += 1
+
+    async def send(self, to_user_id: int) -> None:
+        await self.websocket.send(
+            json.dumps({"to_user_id": to_user_id, "text": repr(time.perf_counter())})
+        )
+
+
+def percentiles(values: List[float]) -> str:
+    if not values:
+        return "no samples"
+    values = sorted(values)
+    cuts = statistics.quantiles(values, n=100) if len(values) > 1 else values * 99
+    return (
+        f"p50 {cuts[49] * 1e3:8.2f} ms  p95 {cuts[94] * 1e3:8.2f} ms  "
+        f"p99 {cuts[98] * 1e3:8.2f} ms  max {values[-1] * 1e3:8.2f} ms"
+    )
+
+
+async def drive(
+    clients: List[Client], peer_ids: List[int], rate: float, duration: float
+) -> int:
+    # a fixed schedule, a slow send does not lower the offered rate
+    sent = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < duration:
+        sender = random.choice(clients)
+        receiver_id = random.choice(peer_ids)
+        if receiver_id == sender.user_id:
+            continue
+        await sender.send(receiver_id)
+        sent += 1
+        delay = start + sent / rate - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+    return sent
+
+
+async def run_clients(
+    url: str,
+    tokens: Dict[int, str],
+    peer_ids: List[int],
+    rate: float,
+    duration: float,
+    drain: float,
+    barrier,
+) -> dict:
+    clients = [Client(user_id, token, url) for user_id, token in tokens.items()]
+    for start in range(0, len(clients), 50):
+        await asyncio.gather(*(c.connect() for c in clients[start : start + 50]))
+    latencies: List[float] = []
+    receivers = [asyncio.create_task(c.receive(latencies)) for c in clients]
+    # every process is connected before anyone sends, the loop keeps
+    # answering pings meanwhile
+    await asyncio.get_running_loop().run_in_executor(None, barrier.wait)
+    started = time.perf_counter()
+    sent = await drive(clients, peer_ids, rate, duration)
+    send_window = time.perf_counter() - started
+    # frames still in flight get a moment to arrive
+    await asyncio.sleep(drain)
+    for task in receivers:
+        task.cancel()
+    await asyncio.gather(*(c.websocket.close() for c in clients))
+    return {
+        "sent": sent,
+        "received": sum(c.received for c in clients),
+        "latencies": latencies,
+        "send_window": send_window,
+    }
+
+
+def client_process(url, tokens, peer_ids, rate, duration, drain, barrier, results):
+    results.put(
+        asyncio.run(run_clients(url, tokens, peer_ids, rate, duration, drain, barrier))
+    )
+
+
+def run(args, server: ServerThread, user_ids: List[int]) -> None:
+    url = f"ws://127.0.0.1:{args.port}{settings.URL_PREFIX}/chat/ws"
+    tokens = {
+        user_id: create_access_token({"sub": str(user_id)}) for user_id in user_ids
+    }
+    # spawned, forking a process that runs the server thread is not safe
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(args.processes + 1)
+    results = context.Queue()
+    processes = [
+        context.Process(
+            target=client_process,
+            args=(
+                url,
+                {user_id: tokens[user_id] for user_id in user_ids[i :: args.processes]},
+                user_ids,
+                args.rate / args.processes,
+                args.duration,
+                args.drain,
+                barrier,
+                results,
+            ),
+            daemon=True,
+        )
+        for i in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    barrier.wait(timeout=args.connect_timeout)
+    since = datetime.utcnow()
+    lags: List[float] = []
+    stop = threading.Event()
+    lag_probe = asyncio.run_coroutine_threadsafe(
+        probe_lag(args.lag_interval, lags, stop), server.loop
+    )
+    outcomes = [
+        results.get(timeout=args.duration + args.drain + args.connect_timeout)
+        for _ in processes
+    ]
+    stop.set()
+    lag_probe.result()
+    for process in processes:
+        process.join()
+    written = count_messages(user_ids, since)
+
+    sent = sum(outcome["sent"] for outcome in outcomes)
+    received = sum(outcome["received"] for outcome in outcomes)
+    latencies = [value for outcome in outcomes for value in outcome["latencies"]]
+    send_window = max(outcome["send_window"] for outcome in outcomes)
+    print(
+        f"clients  {len(user_ids)} in {args.processes} processes, "
+        f"offered {args.rate:.0f} msg/s for {args.duration}s"
+    )
+    print(f"sent     {sent} ({sent / send_window:.0f} msg/s)")
+    print(f"received {received} ({received / max(sent, 1):.1%} delivered)")
+    print(f"latency  {percentiles(latencies)}")
+    print(f"loop lag {percentiles(lags)}")
+    print(f"db       {written} rows ({written / send_window:.0f} writes/s)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=100)
+    parser.add_argument("--rate", type=float, default=200, help="messages per second")
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--drain", type=float, default=2)
+    parser.add_argument("--lag-interval", type=float, default=0.05)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--processes", type=int, default=2, help="client processes")
+    parser.add_argument("--connect-timeout", type=float, default=60)
+    parser.add_argument("--keep", action="store_true", help="keep the messages")
+    args = parser.parse_args()
+    if args.clients < 2:
+        parser.error("at least 2 clients are needed")
+    if not 0 < args.processes <= args.clients:
+        parser.error("between 1 and --clients processes are needed")
+
+    user_ids = ensure_users(args.clients)
+    server = ServerThread(args.port)
+    server.start()
+    try:
+        run(args, server, user_ids)
+    finally:
+        server.stop()
+        if not args.keep:
+            delete_messages(user_ids)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Serialization cost of one page of project listings.
+
+Compares the default fastapi path (response_model validation + jsonable_encoder
++ stdlib json) with returning a FastJSONResponse built from the output models.
+
+run from the backend folder:
+    python -m benchmarks.serialization --rows 50 --number 2000
+"""
+import argparse
+import asyncio
+import timeit
+from datetime import datetime, timedelta
+from typing import List
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from api.core.models import ProjectList, StatusOut, TechnologyOut
+from api.core.responses import FastJSONResponse
+
+
+def build_page(rows: int) -> List[ProjectList]:
+    now = datetime.utcnow()
+    status = StatusOut(id=1, title="unassigned")
+    technologies = [
+        TechnologyOut(id=i, title=f"technology {i}", slug=f"technology-{i}")
+        for i in range(3)
+    ]
+    return [
+        ProjectList(
+            id=i,
+            title=f"project {i}",
+            description="lorem ipsum dolor sit amet " * 8,
+            price_from=300000,
+            price_to=500000 + i,
+            expire_at=now + timedelta(days=15),
+            started_at=now,
+            technologies=technologies,
+            status=status,
+        )
+        for i in range(rows)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=50)
+    parser.add_argument("--number", type=int, default=2000)
+    args = parser.parse_args()
+
+    page = build_page(args.rows)
+    field = create_response_field(name="Response", type_=List[ProjectList])
+
+    def default_path():
+        content = asyncio.run(
+            serialize_response(
+                field=field,
+                response_content=page,
+                exclude_none=True,
+                is_coroutine=False,
+            )
+        )
+        return JSONResponse(content).body
+
+    def fast_path():
+        return FastJSONResponse(page).body
+
+    # asyncio.run overhead is measured separately so it can be subtracted
+    loop_overhead = timeit.timeit(
+        lambda: asyncio.run(asyncio.sleep(0)), number=args.number
+    )
+    results = {
+        "default": timeit.timeit(default_path, number=args.number) - loop_overhead,
+        "fast": timeit.timeit(fast_path, number=args.number),
+    }
+    for name, total in results.items():
+        print(f"{name:>8}: {total / args.number * 1e6:9.1f} us per {args.rows}-row page")
+    print(f"speedup: {results['default'] / results['fast']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()